@@ -6,6 +6,8 @@ import chess.engine
 import chess.pgn
 import google.generativeai as genai
 
+from game_modes import GEMINI_REPLY_NOISE
+
 # --- CONFIGURATION ---
 # REPLACE THIS with the path to your downloaded stockfish file
 # Windows example: "C:/Users/Jon/Downloads/stockfish/stockfish-windows-x86-64.exe"
@@ -46,26 +48,27 @@ def get_gemini_move(board, gemini_color, retries=3):
     IMPORTANT: Reply ONLY with the move in UCI format (e.g., e7e5). Do not write any other text.
     """
 
+    # Only the latest error is sent back, so retries don't keep growing the prompt
+    last_error = ""
+
     for attempt in range(retries):
         try:
-            response = model.generate_content(prompt)
-            move_str = response.text.strip().replace("\n", "").replace(" ", "")
-
-            # clean up common formatting issues if Gemini adds markdown
-            move_str = move_str.replace("`", "")
+            response = model.generate_content(prompt + last_error)
+            # clean up whitespace and markdown backticks in one pass
+            move_str = GEMINI_REPLY_NOISE.sub("", response.text)
 
             move = chess.Move.from_uci(move_str)
 
-            if move in board.legal_moves:
+            if board.is_legal(move):
                 return move
             else:
                 print(f" > Gemini tried illegal move: {move_str}. Retrying...")
                 # Add feedback to the next prompt (In-Context Learning)
-                prompt += f"\n\nERROR: {move_str} is not a legal move. Please choose strictly from the provided list."
+                last_error = f"\n\nERROR: {move_str} is not a legal move. Please choose strictly from the provided list."
 
         except Exception as e:
             print(f" > Error parsing Gemini response: {e}")
-            prompt += f"\n\nERROR: Invalid format. Please reply ONLY with the move string (e.g., e7e5)."
+            last_error = f"\n\nERROR: Invalid format. Please reply ONLY with the move string (e.g., e7e5)."
 
     # If Gemini fails 3 times, we make a random move to keep the game going (fallback)
     print(" > Gemini failed to produce a legal move. Making random move.")
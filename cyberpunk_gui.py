@@ -17,6 +17,8 @@ import chess
 import chess.engine
 import chess.pgn
 
+from game_modes import GEMINI_REPLY_NOISE
+
 try:
     import google.generativeai as genai
 
@@ -897,27 +899,25 @@ class CyberpunkChessGUI:
         IMPORTANT: Reply ONLY with the move in UCI format (e.g., e7e5). Do not write any other text.
         """
 
+        # Only the latest error is sent back, so retries don't keep growing the prompt
+        last_error = ""
+
         for attempt in range(retries):
             try:
-                response = self.gemini_model.generate_content(prompt)
-                move_str = (
-                    response.text.strip()
-                    .replace("\n", "")
-                    .replace(" ", "")
-                    .replace("`", "")
-                )
+                response = self.gemini_model.generate_content(prompt + last_error)
+                move_str = GEMINI_REPLY_NOISE.sub("", response.text)
 
                 move = chess.Move.from_uci(move_str)
 
-                if move in self.board.legal_moves:
+                if self.board.is_legal(move):
                     return move
                 else:
                     print(f"Gemini tried illegal move: {move_str}. Retrying...")
-                    prompt += f"\n\nERROR: {move_str} is not a legal move. Please choose strictly from the provided list."
+                    last_error = f"\n\nERROR: {move_str} is not a legal move. Please choose strictly from the provided list."
 
             except Exception as e:
                 print(f"Error parsing Gemini response: {e}")
-                prompt += f"\n\nERROR: Invalid format. Please reply ONLY with the move string (e.g., e7e5)."
+                last_error = f"\n\nERROR: Invalid format. Please reply ONLY with the move string (e.g., e7e5)."
 
         # Fallback to random move
         print("Gemini failed to produce a legal move. Making random move.")
@@ -3,12 +3,20 @@ Database module for Cyberchess.
 Manages user accounts, ratings, and game history using SQLite.
 """
 
+import contextlib
 import datetime
+import functools
 import hashlib
 import sqlite3
 from typing import Dict, List, Optional, Tuple
 
 
+@functools.lru_cache(maxsize=4096)
+def _expected_score(player_rating: int, opponent_rating: int) -> float:
+    """Expected Elo score of a player; the same pairings recur often."""
+    return 1 / (1 + 10 ** ((opponent_rating - player_rating) / 400))
+
+
 class ChessDatabase:
     """Database manager for Cyberchess."""
 
@@ -16,6 +24,7 @@ class ChessDatabase:
         """Initialize database connection."""
         self.db_path = db_path
         self.conn = None
+        self._in_transaction = False
         self.initialize_database()
 
     def connect(self):
@@ -31,6 +40,29 @@ class ChessDatabase:
             self.conn.row_factory = sqlite3.Row
         return self.conn
 
+    def _commit(self):
+        """Commit, unless the write is part of a transaction() block."""
+        if not self._in_transaction:
+            self.conn.commit()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group several writes into a single commit, rolled back if the block
+        raises. The connection is shared, so don't use this while other
+        threads are writing through the same ChessDatabase.
+        """
+        conn = self.connect()
+        self._in_transaction = True
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
     def close(self):
         """Close database connection."""
         if self.conn:
@@ -116,7 +148,7 @@ class ChessDatabase:
         """
         )
 
-        conn.commit()
+        self._commit()
 
     def hash_password(self, password: str) -> str:
         """
@@ -146,7 +178,7 @@ class ChessDatabase:
                 "INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)",
                 (username, password_hash, email),
             )
-            conn.commit()
+            self._commit()
             return cursor.lastrowid
         except sqlite3.IntegrityError:
             return None  # Username or email already exists
@@ -169,7 +201,7 @@ class ChessDatabase:
                 "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE user_id = ?",
                 (row["user_id"],),
             )
-            conn.commit()
+            self._commit()
             return dict(row)
         return None
 
@@ -199,7 +231,7 @@ class ChessDatabase:
         cursor.execute(
             "UPDATE users SET rating = ? WHERE user_id = ?", (new_rating, user_id)
         )
-        conn.commit()
+        self._commit()
 
     def record_game(
         self,
@@ -270,7 +302,7 @@ class ChessDatabase:
                 (white_player_id, black_player_id),
             )
 
-        conn.commit()
+        self._commit()
         return game_id
 
     def get_user_games(self, user_id: int, limit: int = 10) -> List[Dict]:
@@ -328,10 +360,34 @@ class ChessDatabase:
         Returns:
             New rating for the player
         """
-        expected_score = 1 / (1 + 10 ** ((opponent_rating - player_rating) / 400))
+        expected_score = _expected_score(player_rating, opponent_rating)
         new_rating = player_rating + k_factor * (score - expected_score)
         return int(round(new_rating))
 
+    def calculate_elo_delta(
+        self,
+        white_rating: int,
+        black_rating: int,
+        white_score: float,
+        k_factor: int = 32,
+    ) -> Tuple[int, int]:
+        """
+        Calculate both players' rating changes after a game in one step.
+        The expected scores sum to 1, so Black's change is minus White's.
+
+        Args:
+            white_rating: Current rating of White
+            black_rating: Current rating of Black
+            white_score: 1.0 if White won, 0.5 for a draw, 0.0 if White lost
+            k_factor: K-factor for Elo calculation (default 32)
+
+        Returns:
+            Tuple of (white_change, black_change)
+        """
+        expected_white = _expected_score(white_rating, black_rating)
+        white_change = int(round(k_factor * (white_score - expected_white)))
+        return white_change, -white_change
+
     def join_matchmaking_queue(
         self, user_id: int, rating: int, time_control: str = "blitz"
     ) -> bool:
@@ -344,7 +400,7 @@ class ChessDatabase:
                 "INSERT INTO matchmaking_queue (user_id, rating, time_control) VALUES (?, ?, ?)",
                 (user_id, rating, time_control),
             )
-            conn.commit()
+            self._commit()
             return True
         except sqlite3.IntegrityError:
             return False  # User already in queue
@@ -355,7 +411,7 @@ class ChessDatabase:
         cursor = conn.cursor()
 
         cursor.execute("DELETE FROM matchmaking_queue WHERE user_id = ?", (user_id,))
-        conn.commit()
+        self._commit()
 
     def find_match(self, user_id: int, rating_range: int = 200) -> Optional[Dict]:
         """Find a match for a user from the queue."""
@@ -416,7 +472,7 @@ class ChessDatabase:
                 300.0,
             ),
         )
-        conn.commit()
+        self._commit()
 
     def get_active_game(self, session_id: str) -> Optional[Dict]:
         """Get an active game by session ID."""
@@ -449,7 +505,7 @@ class ChessDatabase:
         """,
             (fen, move_history, white_time, black_time, session_id),
         )
-        conn.commit()
+        self._commit()
 
     def delete_active_game(self, session_id: str):
         """Delete an active game session."""
@@ -457,4 +513,4 @@ class ChessDatabase:
         cursor = conn.cursor()
 
         cursor.execute("DELETE FROM active_games WHERE session_id = ?", (session_id,))
-        conn.commit()
+        self._commit()
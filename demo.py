@@ -45,8 +45,7 @@ def demo_basic_features():
     temp_board = chess.Board()
     san_moves = []
     for move in board.move_stack:
-        san_moves.append(temp_board.san(move))
-        temp_board.push(move)
+        san_moves.append(temp_board.san_and_push(move))
     print("Move history (SAN):", san_moves)
 
 
@@ -195,8 +194,7 @@ def demo_pgn_loading():
                 if move_count >= 5:  # Show first 5 moves
                     print("... (game continues)")
                     break
-                san = board.san(move)
-                board.push(move)
+                san = board.san_and_push(move)
                 move_count += 1
                 if board.turn == chess.WHITE:  # Just made black's move
                     print(f"{board.fullmove_number - 1}. ... {san}")
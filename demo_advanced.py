@@ -74,9 +74,7 @@ def demo_opening_book():
     move_display = []
 
     for move_uci in italian_moves:
-        move = chess.Move.from_uci(move_uci)
-        san = board.san(move)
-        board.push(move)
+        san = board.san_and_push(chess.Move.from_uci(move_uci))
         move_display.append(san)
 
     print(f"  Moves played: {' '.join(move_display)}")
@@ -98,9 +96,7 @@ def demo_opening_book():
     move_display2 = []
 
     for move_uci in qg_moves:
-        move = chess.Move.from_uci(move_uci)
-        san = board2.san(move)
-        board2.push(move)
+        san = board2.san_and_push(chess.Move.from_uci(move_uci))
         move_display2.append(san)
 
     print(f"  Moves played: {' '.join(move_display2)}")
@@ -127,17 +123,13 @@ def demo_puzzle_trainer():
     print(f"\n🧩 Puzzle library contains {len(trainer.puzzles)} puzzles")
 
     # Show puzzle statistics
-    themes = {}
-    difficulties = {}
-
-    for puzzle in trainer.puzzles:
-        themes[puzzle.theme] = themes.get(puzzle.theme, 0) + 1
-        difficulties[puzzle.difficulty] = difficulties.get(puzzle.difficulty, 0) + 1
+    themes = trainer.theme_counts
+    difficulties = trainer.difficulty_counts
 
     print("\n📊 Puzzle Statistics:")
-    print(f"  Themes: {', '.join(f'{k} ({v})' for k, v in sorted(themes.items()))}")
+    print(f"  Themes: {', '.join(f'{k} ({v})' for k, v in themes.most_common())}")
     print(
-        f"  Difficulty: {', '.join(f'{k} ({v})' for k, v in sorted(difficulties.items()))}"
+        f"  Difficulty: {', '.join(f'{k} ({v})' for k, v in difficulties.most_common())}"
     )
 
     # Show an example puzzle
@@ -154,16 +146,7 @@ def demo_puzzle_trainer():
         print(f"\n  {'White' if board.turn == chess.WHITE else 'Black'} to move")
         print(f"  Solution: {' '.join(puzzle.solution)}")
 
-        # Show the solution in SAN
-        temp_board = board.copy()
-        san_solution = []
-        for move_uci in puzzle.solution:
-            move = chess.Move.from_uci(move_uci)
-            san = temp_board.san(move)
-            san_solution.append(san)
-            temp_board.push(move)
-
-        print(f"  Solution (SAN): {' '.join(san_solution)}")
+        print(f"  Solution (SAN): {' '.join(puzzle.san_solution)}")
 
     print("\n✅ Puzzle trainer demonstration complete!")
 
@@ -3,16 +3,23 @@ Game modes module for Cyberchess.
 Provides different ways to play chess (PvP, PvE, AI vs AI).
 """
 
+import asyncio
+import concurrent.futures
 import datetime
+import itertools
+import multiprocessing
+import os
 import random
+import re
+import shelve
 import sys
+import threading
 import time
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, TextIO, Tuple, Union
 
 import chess
 import chess.engine
 import chess.pgn
-import google.generativeai as genai
 
 # Configure stdout/stderr to use UTF-8 encoding on Windows
 if sys.stdout.encoding != "utf-8":
@@ -20,6 +27,146 @@ if sys.stdout.encoding != "utf-8":
 if sys.stderr.encoding != "utf-8":
     sys.stderr.reconfigure(encoding="utf-8")
 
+# Starting position that new boards are copied from, instead of being set up
+# piece by piece every time
+_STARTING_BOARD = chess.Board()
+
+# SAN strings keyed by (position, move). SAN depends only on the position,
+# so replays of the same lines (demos, openings, training games) skip the
+# check/mate detection that formatting a move needs. Cleared when full.
+_SAN_CACHE: Dict[tuple, str] = {}
+_SAN_CACHE_SIZE = 1 << 16
+
+# Long-lived Stockfish processes shared between games, keyed by executable path
+_SHARED_ENGINES: Dict[Union[str, tuple], chess.engine.SimpleEngine] = {}
+
+
+def get_shared_engine(
+    stockfish_path: Union[str, List[str]],
+) -> chess.engine.SimpleEngine:
+    """
+    Get a Stockfish process that is reused across games.
+
+    Spawning Stockfish and completing the UCI handshake costs far more than a
+    short search, so games played back to back share one process. Games pass
+    themselves as ``game=`` when searching, which makes python-chess send
+    ``ucinewgame`` whenever a different game starts using the engine.
+
+    The engine runs on a non-daemon thread, so callers must call
+    close_shared_engines() once they are done or the interpreter won't exit.
+    """
+    key = stockfish_path if isinstance(stockfish_path, str) else tuple(stockfish_path)
+    engine = _SHARED_ENGINES.get(key)
+    if engine is None:
+        engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+        _SHARED_ENGINES[key] = engine
+    return engine
+
+
+def close_shared_engines():
+    """Shut down all shared Stockfish processes."""
+    while _SHARED_ENGINES:
+        _, engine = _SHARED_ENGINES.popitem()
+        try:
+            engine.quit()
+        except chess.engine.EngineError:
+            pass
+
+
+# Whitespace and markdown backticks around a Gemini move reply
+GEMINI_REPLY_NOISE = re.compile(r"[\s`]+")
+
+# Gemini models shared by all AI vs AI games, keyed by (API key, instructions)
+_GEMINI_MODELS: Dict[Tuple[str, str], Any] = {}
+_GEMINI_MODELS_LOCK = threading.Lock()
+
+
+def _get_gemini_model(google_api_key: str, system_instruction: str):
+    """
+    Get a Gemini model shared by every game with the same key and instructions.
+    genai.configure() changes global client state, so it only runs when a new
+    model is created rather than once per game.
+    """
+    import google.generativeai as genai
+
+    key = (google_api_key, system_instruction)
+    with _GEMINI_MODELS_LOCK:
+        model = _GEMINI_MODELS.get(key)
+        if model is None:
+            genai.configure(api_key=google_api_key)
+            model = genai.GenerativeModel(
+                "gemini-1.5-flash", system_instruction=system_instruction
+            )
+            _GEMINI_MODELS[key] = model
+    return model
+
+
+def _score_to_cp(score: Optional[chess.engine.PovScore]) -> int:
+    """Convert an engine score to centipawns from White's perspective."""
+    if score is None:
+        return 0
+
+    # Mates count as +/-10000 so they still compare and average as numbers
+    cp = score.white().score(mate_score=10000)
+    return cp if cp is not None else 0
+
+
+def _open_analysis_cache(cache_path: Optional[str]):
+    """Open the on-disk analysis cache, if a path was given."""
+    if not cache_path:
+        return None
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    return shelve.open(cache_path)
+
+
+def _analysis_cache_key(engine_name: str, key: tuple) -> str:
+    """Cache key for a position; salted with the engine's name and version."""
+    return f"{engine_name}|{key}"
+
+
+def _cached_evals(
+    cache, engine_name: str, positions: Dict[tuple, chess.Board], depth: int
+) -> Dict[tuple, int]:
+    """Evaluations from the cache that were searched at least as deep."""
+    evals = {}
+    for key in positions:
+        entry = cache.get(_analysis_cache_key(engine_name, key))
+        if entry is not None and entry["depth"] >= depth:
+            evals[key] = entry["cp"]
+    return evals
+
+
+class PgnSink:
+    """
+    Append-only PGN writer that keeps the file open across games.
+
+    Usage:
+        with PgnSink("games.pgn") as sink:
+            for game in games:
+                game.save_to_pgn("games.pgn", "White", "Black", sink=sink)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self) -> "PgnSink":
+        self._file = open(self.path, "a")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, pgn_text: str):
+        """Append one game's PGN text."""
+        self._file.write(pgn_text + "\n\n")
+
+    def close(self):
+        """Flush and close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
 
 class ChessGame:
     """Base chess game class with common functionality."""
@@ -31,46 +178,61 @@ class ChessGame:
         "borders": "Unicode with borders and coordinates",
     }
 
-    def __init__(self, theme: str = "ascii"):
-        self.board = chess.Board()
+    # How each theme turns the board into text
+    _RENDERERS = {
+        "ascii": str,
+        "unicode": chess.Board.unicode,
+        "borders": lambda board: board.unicode(borders=True),
+    }
+
+    def __init__(self, theme: str = "ascii", record_san: bool = True):
+        self.board = _STARTING_BOARD.copy(stack=False)
         self.move_history = []
+
+        # Without SAN, make_move() returns UCI and leaves move_history empty
+        # (it is read as a SAN log elsewhere); to_pgn() then renders the SAN
+        # for the whole game in one pass at export time
+        self.record_san = record_san
         self.time_controls = None  # Optional time control settings
         self.white_time = None
         self.black_time = None
         self.theme = theme if theme in self.THEMES else "ascii"
+        self._outcome = None
+        self._outcome_key = None
 
     def display_board(self):
         """Display the current board state using the selected theme."""
-        print("\n" + "=" * 50)
-        print(f"Move {self.board.fullmove_number}")
+        # Collect the lines and print them in one go, rather than writing to
+        # the terminal line by line between moves
+        lines = ["", "=" * 50, f"Move {self.board.fullmove_number}"]
 
         # Display time if time controls are enabled
         if self.time_controls is not None:
             white_time_str = self.format_time(self.white_time)
             black_time_str = self.format_time(self.black_time)
-            print(f"⏱️  White: {white_time_str} | Black: {black_time_str}")
+            lines.append(f"⏱️  White: {white_time_str} | Black: {black_time_str}")
 
         # Display board based on theme
-        if self.theme == "unicode":
-            print(self.board.unicode())
-        elif self.theme == "borders":
-            print(self.board.unicode(borders=True))
-        else:  # ascii
-            print(self.board)
+        lines.append(self._RENDERERS[self.theme](self.board))
 
         # Display game state
+        outcome = self.outcome()
+        termination = outcome.termination if outcome else None
+
         if self.board.is_check():
-            print("⚠️  CHECK!")
-        if self.board.is_checkmate():
-            print("♔ CHECKMATE!")
-        if self.board.is_stalemate():
-            print("🤝 STALEMATE!")
-        if self.board.is_insufficient_material():
-            print("🤝 DRAW - Insufficient Material")
+            lines.append("⚠️  CHECK!")
+        if termination == chess.Termination.CHECKMATE:
+            lines.append("♔ CHECKMATE!")
+        if termination == chess.Termination.STALEMATE:
+            lines.append("🤝 STALEMATE!")
+        if termination == chess.Termination.INSUFFICIENT_MATERIAL:
+            lines.append("🤝 DRAW - Insufficient Material")
         if self.board.is_fifty_moves():
-            print("🤝 DRAW - 50 Move Rule")
+            lines.append("🤝 DRAW - 50 Move Rule")
         if self.board.is_repetition():
-            print("🤝 DRAW - Threefold Repetition")
+            lines.append("🤝 DRAW - Threefold Repetition")
+
+        print("\n".join(lines))
 
     def display_move_history(self):
         """Display the game's move history in algebraic notation."""
@@ -78,24 +240,49 @@ class ChessGame:
             print("\nNo moves yet.")
             return
 
-        print("\nMove History:")
-        print("-" * 50)
-        for i in range(0, len(self.move_history), 2):
-            move_num = i // 2 + 1
-            white_move = self.move_history[i]
-            black_move = (
-                self.move_history[i + 1] if i + 1 < len(self.move_history) else ""
-            )
-            print(f"{move_num}. {white_move:8} {black_move}")
+        lines = ["", "Move History:", "-" * 50]
+        white_moves = self.move_history[0::2]
+        black_moves = self.move_history[1::2]
+        for move_num, (white_move, black_move) in enumerate(
+            itertools.zip_longest(white_moves, black_moves, fillvalue=""), 1
+        ):
+            lines.append(f"{move_num}. {white_move:8} {black_move}")
+
+        print("\n".join(lines))
 
     def make_move(self, move: chess.Move) -> str:
-        """Make a move and record it in history. Returns the SAN notation."""
-        # Convert to SAN (Standard Algebraic Notation) before making the move
-        san_move = self.board.san(move)
-        self.board.push(move)
+        """
+        Make a move and record it in history. Returns the SAN notation, or
+        the UCI notation when record_san is off.
+        """
+        if not self.record_san:
+            self.board.push(move)
+            return move.uci()
+
+        key = (self.board._transposition_key(), move)
+        san_move = _SAN_CACHE.get(key)
+
+        if san_move is None:
+            # san_and_push works out the SAN (Standard Algebraic Notation)
+            # while making the move, instead of san() pushing and popping it
+            if len(_SAN_CACHE) >= _SAN_CACHE_SIZE:
+                _SAN_CACHE.clear()
+            san_move = _SAN_CACHE[key] = self.board.san_and_push(move)
+        else:
+            self.board.push(move)
+
         self.move_history.append(san_move)
         return san_move
 
+    def legal_move_hint(self, limit: int = 10) -> str:
+        """
+        List the first few legal moves in UCI for the move prompt.
+        Only `limit` moves are generated; input is then checked with
+        board.is_legal(), so the full legal move list is never built.
+        """
+        hint_moves = itertools.islice(self.board.legal_moves, limit)
+        return ", ".join(move.uci() for move in hint_moves)
+
     def set_theme(self, theme: str):
         """Set the board display theme."""
         if theme in self.THEMES:
@@ -113,115 +300,314 @@ class ChessGame:
         for key, description in cls.THEMES.items():
             print(f"  {key}: {description}")
 
+    def outcome(self) -> Optional[chess.Outcome]:
+        """
+        Get how the game ended, or None if it is still going.
+        The outcome is worked out once per position and shared by
+        is_game_over(), get_result() and display_board().
+        """
+        key = (
+            len(self.board.move_stack),
+            self.board.halfmove_clock,
+            self.board._transposition_key(),
+        )
+        if key != self._outcome_key:
+            self._outcome = self.board.outcome()
+            self._outcome_key = key
+        return self._outcome
+
     def is_game_over(self) -> bool:
         """Check if the game is over."""
-        return self.board.is_game_over()
+        return self.outcome() is not None
 
     def get_result(self) -> str:
         """Get the game result."""
-        return self.board.result()
+        outcome = self.outcome()
+        return outcome.result() if outcome else "*"
+
+    def to_pgn(
+        self,
+        white_player: str,
+        black_player: str,
+        event: str = "Cyberchess Game",
+    ) -> str:
+        """
+        Export the game as PGN text, with header values escaped and the
+        movetext wrapped to fit in 80 columns. The movetext is built from the
+        SAN already recorded in move_history, so no moves are replayed. Games
+        set up from a custom position, or with moves pushed onto the board
+        directly, go through python-chess's exporter.
+        """
+        headers = [
+            ("Event", event),
+            ("Site", "?"),
+            ("Date", datetime.datetime.now().strftime("%Y.%m.%d")),
+            ("Round", "?"),
+            ("White", white_player),
+            ("Black", black_player),
+            ("Result", self.get_result()),
+        ]
+        # Tag values are quoted, so quotes and backslashes in them are escaped
+        headers = [
+            (name, value.replace("\\", "\\\\").replace('"', '\\"'))
+            for name, value in headers
+        ]
+
+        if (
+            len(self.move_history) != len(self.board.move_stack)
+            or self.board.root() != _STARTING_BOARD
+        ):
+            pgn_game = chess.pgn.Game.from_board(self.board)
+            for name, value in headers:
+                pgn_game.headers[name] = value
+            return pgn_game.accept(
+                chess.pgn.StringExporter(headers=True, variations=True, comments=True)
+            )
+
+        tag_pairs = [f'[{name} "{value}"]' for name, value in headers]
+
+        tokens = []
+        for i, san_move in enumerate(self.move_history):
+            if i % 2 == 0:
+                tokens.append(f"{i // 2 + 1}.")
+            tokens.append(san_move)
+        tokens.append(self.get_result())
+
+        # Start a new line before a token that would take it past 79
+        # characters, as python-chess's exporter does
+        lines = [tokens[0]]
+        for token in tokens[1:]:
+            if len(lines[-1]) + 1 + len(token) > 79:
+                lines.append(token)
+            else:
+                lines[-1] += " " + token
+
+        return "\n".join(tag_pairs) + "\n\n" + "\n".join(lines)
 
     def save_to_pgn(
         self,
-        filename: str,
+        filename: Union[str, TextIO],
         white_player: str,
         black_player: str,
         event: str = "Cyberchess Game",
+        sink: Optional["PgnSink"] = None,
     ):
-        """Save the game to a PGN file."""
-        pgn_game = chess.pgn.Game.from_board(self.board)
-        pgn_game.headers["Event"] = event
-        pgn_game.headers["White"] = white_player
-        pgn_game.headers["Black"] = black_player
-        pgn_game.headers["Date"] = datetime.datetime.now().strftime("%Y.%m.%d")
-        pgn_game.headers["Result"] = self.get_result()
-
-        with open(filename, "a") as f:
-            f.write(str(pgn_game) + "\n\n")
+        """
+        Save the game to a PGN file.
+        Pass an open PgnSink to append to it instead of reopening the file,
+        or a text stream (e.g. io.StringIO) as filename to write to it.
+        """
+        pgn_text = self.to_pgn(white_player, black_player, event)
+
+        if sink is not None:
+            sink.write(pgn_text)
+            filename = sink.path
+        elif not isinstance(filename, str):
+            filename.write(pgn_text + "\n\n")
+            filename = getattr(filename, "name", "stream")
+        else:
+            with open(filename, "a") as f:
+                f.write(pgn_text + "\n\n")
         print(f"\n✅ Game saved to '{filename}'")
 
     def analyze_game(
-        self, engine_path: str, depth: int = 15
+        self,
+        engine_path: Optional[str] = None,
+        depth: int = 15,
+        engine: Optional[chess.engine.SimpleEngine] = None,
+        cache_path: Optional[str] = None,
     ) -> List[Tuple[str, int, int]]:
         """
         Analyze the game with an engine and return evaluations for each move.
         Returns list of tuples: (move_san, evaluation_before, evaluation_after)
         Evaluation is in centipawns from White's perspective.
+
+        Pass a running engine to analyse with it instead of starting a pool
+        of new processes from engine_path. Its searches are tagged with this
+        game, so an engine that just played it keeps its hash table. Pass
+        cache_path to keep evaluations on disk: positions already searched at
+        least as deep by the same engine are not searched again.
         """
+        if engine is None:
+            return asyncio.run(
+                self.analyze_game_async(engine_path, depth, cache_path=cache_path)
+            )
+
         print("\n" + "=" * 50)
         print("🔍 ANALYZING GAME WITH ENGINE...")
         print("=" * 50)
 
-        engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+        san_moves, keys, positions = self._analysis_positions()
+        limit = chess.engine.Limit(depth=depth)
+        engine_name = engine.id.get("name", "")
 
+        cache = _open_analysis_cache(cache_path)
         try:
-            analysis = []
-            temp_board = chess.Board()
+            evals_by_key = {}
+            if cache is not None:
+                evals_by_key = _cached_evals(cache, engine_name, positions, depth)
+
+            for key, board in positions.items():
+                if key in evals_by_key:
+                    continue
+                info = engine.analyse(board, limit, game=self)
+                evals_by_key[key] = _score_to_cp(info.get("score"))
+                if cache is not None:
+                    cache[_analysis_cache_key(engine_name, key)] = {
+                        "depth": depth,
+                        "cp": evals_by_key[key],
+                    }
+        finally:
+            if cache is not None:
+                cache.close()
 
-            for i, move in enumerate(self.board.move_stack):
-                # Get evaluation before the move
-                info_before = engine.analyse(
-                    temp_board, chess.engine.Limit(depth=depth)
-                )
-                score_before = info_before.get("score")
+        return self._analysis_report(san_moves, [evals_by_key[key] for key in keys])
 
-                # Make the move
-                san_move = temp_board.san(move)
-                temp_board.push(move)
+    async def analyze_game_async(
+        self,
+        engine_path: str,
+        depth: int = 15,
+        pool_size: Optional[int] = None,
+        cache_path: Optional[str] = None,
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Analyze the game with a pool of engines.
 
-                # Get evaluation after the move
-                info_after = engine.analyse(temp_board, chess.engine.Limit(depth=depth))
-                score_after = info_after.get("score")
+        Every position is evaluated independently, so the searches are spread
+        over pool_size engine processes (half the CPU count by default).
+        Positions found in the cache at cache_path are not searched, and the
+        pool only grows as large as the rest need.
+        Returns the same tuples as analyze_game().
+        """
+        print("\n" + "=" * 50)
+        print("🔍 ANALYZING GAME WITH ENGINE...")
+        print("=" * 50)
 
-                # Convert scores to centipawns (from White's perspective)
-                eval_before = self._score_to_cp(score_before, temp_board.turn)
-                eval_after = self._score_to_cp(score_after, not temp_board.turn)
+        san_moves, keys, positions = self._analysis_positions()
 
-                analysis.append((san_move, eval_before, eval_after))
+        if pool_size is None:
+            pool_size = max(1, (os.cpu_count() or 1) // 2)
+        pool_size = max(1, min(pool_size, len(positions)))
 
-                print(
-                    f"Move {i+1}: {san_move:8} | Before: {eval_before:+6} cp | After: {eval_after:+6} cp"
-                )
+        limit = chess.engine.Limit(depth=depth)
+        engines: asyncio.Queue = asyncio.Queue()
+        started = []
+
+        async def evaluate(board: chess.Board) -> int:
+            engine = await engines.get()
+            try:
+                info = await engine.analyse(board, limit)
+            finally:
+                engines.put_nowait(engine)
+            return _score_to_cp(info.get("score"))
 
-            return analysis
+        cache = _open_analysis_cache(cache_path)
+        try:
+            # The first engine identifies itself for the cache lookup
+            _, engine = await chess.engine.popen_uci(engine_path)
+            started.append(engine)
+            engines.put_nowait(engine)
+            engine_name = engine.id.get("name", "")
+
+            evals_by_key = {}
+            if cache is not None:
+                evals_by_key = _cached_evals(cache, engine_name, positions, depth)
+            pending = {
+                key: board
+                for key, board in positions.items()
+                if key not in evals_by_key
+            }
+
+            for _ in range(min(pool_size, len(pending)) - 1):
+                _, engine = await chess.engine.popen_uci(engine_path)
+                started.append(engine)
+                engines.put_nowait(engine)
+
+            scores = await asyncio.gather(
+                *(evaluate(board) for board in pending.values())
+            )
+            for key, cp in zip(pending, scores):
+                evals_by_key[key] = cp
+                if cache is not None:
+                    cache[_analysis_cache_key(engine_name, key)] = {
+                        "depth": depth,
+                        "cp": cp,
+                    }
 
         finally:
-            engine.quit()
+            for engine in started:
+                await engine.quit()
+            if cache is not None:
+                cache.close()
+
+        return self._analysis_report(san_moves, [evals_by_key[key] for key in keys])
 
-    def _score_to_cp(self, score, from_perspective: chess.Color) -> int:
+    def _analysis_positions(
+        self,
+    ) -> Tuple[List[str], List[tuple], Dict[tuple, chess.Board]]:
         """
-        Convert a chess.engine.Score to centipawns.
-        Returns the score from White's perspective.
+        Replay the game once to get every position that needs evaluating.
+
+        Returns the SAN of each move, the transposition key of every position
+        (start included) and one board per distinct key. The evaluation after
+        a move is the evaluation before the next one, and repeated positions
+        are only searched once. Boards are copied without their move stack,
+        so each search sends the engine one short "position fen" line instead
+        of the whole game so far.
         """
-        if score is None:
-            return 0
+        # SAN comes from move_history when it was recorded during play
+        have_san = len(self.move_history) == len(self.board.move_stack)
+        temp_board = _STARTING_BOARD.copy(stack=False)
+        san_moves = list(self.move_history) if have_san else []
+        keys = [temp_board._transposition_key()]
+        positions = {keys[0]: temp_board.copy(stack=False)}
+        for move in self.board.move_stack:
+            if have_san:
+                temp_board.push(move)
+            else:
+                san_moves.append(temp_board.san_and_push(move))
+            key = temp_board._transposition_key()
+            keys.append(key)
+            if key not in positions:
+                positions[key] = temp_board.copy(stack=False)
 
-        # Get score relative to the side to move
-        cp = score.relative.score(mate_score=10000)
+        return san_moves, keys, positions
 
-        if cp is None:
-            cp = 0
+    def _analysis_report(
+        self, san_moves: List[str], evals: List[int]
+    ) -> List[Tuple[str, int, int]]:
+        """Pair up consecutive evaluations per move and print them."""
+        analysis = []
+        lines = []
+        for i, san_move in enumerate(san_moves):
+            eval_before, eval_after = evals[i], evals[i + 1]
+            analysis.append((san_move, eval_before, eval_after))
+
+            lines.append(
+                f"Move {i+1}: {san_move:8} | Before: {eval_before:+6} cp | After: {eval_after:+6} cp"
+            )
 
-        # If the perspective is Black, negate the score
-        if from_perspective == chess.BLACK:
-            cp = -cp
+        if lines:
+            print("\n".join(lines))
 
-        return cp
+        return analysis
 
     def display_game_analysis(self, analysis: List[Tuple[str, int, int]]):
         """Display analysis results in a human-readable format."""
-        print("\n" + "=" * 50)
-        print("📊 GAME ANALYSIS SUMMARY")
-        print("=" * 50)
+        lines = ["", "=" * 50, "📊 GAME ANALYSIS SUMMARY", "=" * 50]
 
+        # Classify the moves and total the evaluations in a single pass,
+        # formatting each report line as it is found
+        brilliant_moves = []
         mistakes = []
         blunders = []
-        brilliant_moves = []
+        total_eval = 0
 
         for i, (move, eval_before, eval_after) in enumerate(analysis):
             move_num = i // 2 + 1
             is_white = i % 2 == 0
             player = "White" if is_white else "Black"
+            total_eval += eval_after
 
             # Calculate evaluation change (from the player's perspective)
             if is_white:
@@ -230,40 +616,34 @@ class ChessGame:
                 eval_change = eval_before - eval_after
 
             # Classify the move
+            entry = f"  Move {move_num} ({player}): {move}"
             if eval_change < -100:
-                blunders.append((move_num, player, move, eval_change))
+                blunders.append(f"{entry} ({eval_change} cp)")
             elif eval_change < -50:
-                mistakes.append((move_num, player, move, eval_change))
+                mistakes.append(f"{entry} ({eval_change} cp)")
             elif eval_change > 100:
-                brilliant_moves.append((move_num, player, move, eval_change))
-
-        # Display brilliant moves
-        if brilliant_moves:
-            print("\n⭐ BRILLIANT MOVES:")
-            for move_num, player, move, change in brilliant_moves:
-                print(f"  Move {move_num} ({player}): {move} (+{change} cp)")
-
-        # Display mistakes
-        if mistakes:
-            print("\n⚠️  MISTAKES:")
-            for move_num, player, move, change in mistakes:
-                print(f"  Move {move_num} ({player}): {move} ({change} cp)")
-
-        # Display blunders
-        if blunders:
-            print("\n❌ BLUNDERS:")
-            for move_num, player, move, change in blunders:
-                print(f"  Move {move_num} ({player}): {move} ({change} cp)")
+                brilliant_moves.append(f"{entry} (+{eval_change} cp)")
+
+        for heading, entries in (
+            ("\n⭐ BRILLIANT MOVES:", brilliant_moves),
+            ("\n⚠️  MISTAKES:", mistakes),
+            ("\n❌ BLUNDERS:", blunders),
+        ):
+            if entries:
+                lines.append(heading)
+                lines.extend(entries)
 
         if not mistakes and not blunders and not brilliant_moves:
-            print(
+            lines.append(
                 "\n✨ Clean game! No significant mistakes or brilliant moves detected."
             )
 
-        # Calculate average position evaluation
+        # Average position evaluation
         if analysis:
-            avg_eval = sum(eval_after for _, _, eval_after in analysis) / len(analysis)
-            print(f"\n📈 Average position evaluation: {avg_eval:+.1f} cp")
+            avg_eval = total_eval / len(analysis)
+            lines.append(f"\n📈 Average position evaluation: {avg_eval:+.1f} cp")
+
+        print("\n".join(lines))
 
     def enable_time_control(self, minutes: int, increment_seconds: int = 0):
         """
@@ -285,12 +665,11 @@ class ChessGame:
         if self.time_controls is None:
             return
 
+        delta = self.time_controls["increment"] - time_used
         if color == chess.WHITE:
-            self.white_time -= time_used
-            self.white_time += self.time_controls["increment"]
+            self.white_time += delta
         else:
-            self.black_time -= time_used
-            self.black_time += self.time_controls["increment"]
+            self.black_time += delta
 
     def get_remaining_time(self, color: chess.Color) -> Optional[float]:
         """Get remaining time for a player in seconds."""
@@ -320,7 +699,10 @@ class PlayerVsPlayerGame(ChessGame):
 
     def get_player_move(self, player_name: str) -> chess.Move:
         """Get a move from a human player."""
-        start_time = time.time()
+        start_time = time.monotonic()
+
+        # The position doesn't change while waiting for input
+        hint = self.legal_move_hint()
 
         while True:
             try:
@@ -333,15 +715,13 @@ class PlayerVsPlayerGame(ChessGame):
                     print(f"⏰ TIME OUT! {player_name} loses on time.")
                     return None
 
-                print(
-                    f"Legal moves: {', '.join([move.uci() for move in list(self.board.legal_moves)[:10]])}..."
-                )
+                print(f"Legal moves: {hint}...")
                 move_str = input("Enter your move (UCI format, e.g., e2e4): ").strip()
 
                 move = chess.Move.from_uci(move_str)
-                if move in self.board.legal_moves:
+                if self.board.is_legal(move):
                     # Update time
-                    time_used = time.time() - start_time
+                    time_used = time.monotonic() - start_time
                     self.update_time(self.board.turn, time_used)
                     return move
                 else:
@@ -399,26 +779,34 @@ class PlayerVsComputerGame(ChessGame):
         player_color: chess.Color = chess.WHITE,
         skill_level: int = 10,
         theme: str = "ascii",
+        share_engine: bool = False,
     ):
         super().__init__(theme=theme)
         self.stockfish_path = stockfish_path
         self.player_color = player_color
         self.skill_level = skill_level
+        self.share_engine = share_engine
         self.engine = None
 
     def start_engine(self):
-        """Start the Stockfish engine."""
-        self.engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
+        """Start the Stockfish engine (or attach to the shared process)."""
+        if self.share_engine:
+            self.engine = get_shared_engine(self.stockfish_path)
+        else:
+            self.engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
         self.engine.configure({"Skill Level": self.skill_level})
 
     def stop_engine(self):
-        """Stop the Stockfish engine."""
-        if self.engine:
+        """Stop the Stockfish engine. Shared engines are left running."""
+        if self.engine and not self.share_engine:
             self.engine.quit()
 
     def get_player_move(self) -> chess.Move:
         """Get a move from the human player."""
-        start_time = time.time()
+        start_time = time.monotonic()
+
+        # The position doesn't change while waiting for input
+        hint = self.legal_move_hint()
 
         while True:
             try:
@@ -431,15 +819,13 @@ class PlayerVsComputerGame(ChessGame):
                     print("⏰ TIME OUT! You lose on time.")
                     return None
 
-                print(
-                    f"Legal moves: {', '.join([move.uci() for move in list(self.board.legal_moves)[:10]])}..."
-                )
+                print(f"Legal moves: {hint}...")
                 move_str = input("Enter your move (UCI format, e.g., e2e4): ").strip()
 
                 move = chess.Move.from_uci(move_str)
-                if move in self.board.legal_moves:
+                if self.board.is_legal(move):
                     # Update time
-                    time_used = time.time() - start_time
+                    time_used = time.monotonic() - start_time
                     self.update_time(self.board.turn, time_used)
                     return move
                 else:
@@ -450,19 +836,23 @@ class PlayerVsComputerGame(ChessGame):
     def get_computer_move(self) -> chess.Move:
         """Get a move from Stockfish."""
         print("\n🤖 Computer is thinking...")
-        start_time = time.time()
+        start_time = time.monotonic()
 
         # Use time limit if time controls are enabled
         if self.time_controls is not None:
             time_limit = min(
                 1.0, self.get_remaining_time(self.board.turn) / self.AI_TIME_FRACTION
             )
-            result = self.engine.play(self.board, chess.engine.Limit(time=time_limit))
+            result = self.engine.play(
+                self.board, chess.engine.Limit(time=time_limit), game=self
+            )
         else:
-            result = self.engine.play(self.board, chess.engine.Limit(time=1.0))
+            result = self.engine.play(
+                self.board, chess.engine.Limit(time=1.0), game=self
+            )
 
         # Update time
-        time_used = time.time() - start_time
+        time_used = time.monotonic() - start_time
         self.update_time(self.board.turn, time_used)
 
         return result.move
@@ -532,7 +922,10 @@ class PlayerVsComputerGame(ChessGame):
                     .lower()
                 )
                 if analyze == "y":
-                    analysis = self.analyze_game(self.stockfish_path, depth=15)
+                    # Reuse the engine from the game, at full strength, rather
+                    # than starting new ones; its hash already holds the game
+                    self.engine.configure({"Skill Level": 20})
+                    analysis = self.analyze_game(engine=self.engine, depth=15)
                     self.display_game_analysis(analysis)
 
         finally:
@@ -553,12 +946,20 @@ class AIvsAIGame(ChessGame):
         stockfish_skill: int = 5,
         stockfish_color: Optional[chess.Color] = None,
         theme: str = "ascii",
+        share_engine: bool = False,
+        display_every: int = 1,
+        record_san: bool = True,
+        gemini_model=None,
     ):
-        super().__init__(theme=theme)
+        super().__init__(theme=theme, record_san=record_san)
         self.stockfish_path = stockfish_path
         self.stockfish_skill = stockfish_skill
+        self.share_engine = share_engine
         self.engine = None
 
+        # Show the board every N plies during play(); 0 only shows the end
+        self.display_every = display_every
+
         # AI color assignment: randomize if not specified
         if stockfish_color is None:
             self.stockfish_color = random.choice([chess.WHITE, chess.BLACK])
@@ -567,71 +968,112 @@ class AIvsAIGame(ChessGame):
 
         self.gemini_color = not self.stockfish_color
 
-        # Setup Gemini
-        genai.configure(api_key=google_api_key)
-        self.gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+        # Setup Gemini. The client library is slow to import, so it's only
+        # loaded once an AI vs AI game is actually created. The instructions
+        # are the same for every move, so they live in the system instruction
+        # rather than being resent each turn. A model passed in (e.g. a
+        # stand-in for tests) is used as is.
+        import google.generativeai as genai
+
+        self._genai = genai
+        if gemini_model is None:
+            gemini_model = _get_gemini_model(
+                google_api_key, self._gemini_instructions()
+            )
+        self.gemini_model = gemini_model
 
     def start_engine(self):
-        """Start the Stockfish engine."""
-        self.engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
+        """Start the Stockfish engine (or attach to the shared process)."""
+        if self.share_engine:
+            self.engine = get_shared_engine(self.stockfish_path)
+        else:
+            self.engine = chess.engine.SimpleEngine.popen_uci(self.stockfish_path)
         self.engine.configure({"Skill Level": self.stockfish_skill})
 
     def stop_engine(self):
-        """Stop the Stockfish engine."""
-        if self.engine:
+        """Stop the Stockfish engine. Shared engines are left running."""
+        if self.engine and not self.share_engine:
             self.engine.quit()
 
     def get_stockfish_move(self) -> chess.Move:
         """Get a move from Stockfish."""
-        result = self.engine.play(self.board, chess.engine.Limit(time=0.1))
+        result = self.engine.play(self.board, chess.engine.Limit(time=0.1), game=self)
         return result.move
 
-    def get_gemini_move(self, retries: int = 3) -> chess.Move:
-        """Get a move from Gemini AI."""
-        legal_moves = [move.uci() for move in self.board.legal_moves]
-
-        # Use Gemini's assigned color
+    def _gemini_instructions(self) -> str:
+        """Build the system instruction describing Gemini's role."""
         color = "White" if self.gemini_color == chess.WHITE else "Black"
 
-        prompt = f"""
-        You are playing a game of Chess against Stockfish. You are playing {color}.
-        
-        Current Board Position (FEN): {self.board.fen()}
-        
-        Here is the list of legally possible moves you can make:
-        {', '.join(legal_moves)}
-        
-        Your goal is to survive and learn. Analyze the board.
-        Pick the best move from the legal list above.
-        
-        IMPORTANT: Reply ONLY with the move in UCI format (e.g., e7e5). Do not write any other text.
+        return (
+            f"You are playing a game of Chess against Stockfish. You are playing {color}. "
+            "Your goal is to survive and learn. Each message gives the current board "
+            "position in FEN. Analyze the board and reply with the best legal move "
+            "in UCI format (e.g., e7e5)."
+        )
+
+    def _gemini_prompt(self) -> str:
+        """Build the move request sent to Gemini for the current position."""
+        return f"Current Board Position (FEN): {self.board.fen()}"
+
+    def _gemini_config(self, legal_moves: List[str]):
+        """
+        Constrain Gemini's reply to one of the legal moves.
+        The legal moves are passed as an enum schema rather than listed in the
+        prompt, so the reply is always a single UCI string from the list.
         """
+        return self._genai.GenerationConfig(
+            response_mime_type="text/x.enum",
+            response_schema={"type": "STRING", "enum": legal_moves},
+        )
 
-        for attempt in range(retries):
-            try:
-                response = self.gemini_model.generate_content(prompt)
-                move_str = (
-                    response.text.strip()
-                    .replace("\n", "")
-                    .replace(" ", "")
-                    .replace("`", "")
-                )
+    def _parse_gemini_reply(self, response) -> Optional[chess.Move]:
+        """Return the legal move named by a Gemini reply, or None."""
+        try:
+            move_str = GEMINI_REPLY_NOISE.sub("", response.text)
 
-                move = chess.Move.from_uci(move_str)
+            move = chess.Move.from_uci(move_str)
 
-                if move in self.board.legal_moves:
-                    return move
-                else:
-                    print(f" > Gemini tried illegal move: {move_str}. Retrying...")
-                    prompt += f"\n\nERROR: {move_str} is not a legal move. Please choose strictly from the provided list."
+            if self.board.is_legal(move):
+                return move
 
-            except Exception as e:
-                print(f" > Error parsing Gemini response: {e}")
-                prompt += f"\n\nERROR: Invalid format. Please reply ONLY with the move string (e.g., e7e5)."
+            print(f" > Gemini tried illegal move: {move_str}")
+
+        except Exception as e:
+            print(f" > Error parsing Gemini response: {e}")
+
+        return None
 
-        # Fallback to random move
+    def _random_fallback_move(self, legal_moves: List[chess.Move]) -> chess.Move:
+        """Pick a random legal move when Gemini fails to produce one."""
         print(" > Gemini failed to produce a legal move. Making random move.")
-        return random.choice(list(self.board.legal_moves))
+        return random.choice(legal_moves)
+
+    def get_gemini_move(self, retries: int = 3) -> chess.Move:
+        """
+        Get a move from Gemini AI.
+        Requests are retried only on errors; a reply outside the legal move
+        list falls back to a random move straight away.
+        """
+        # Legal moves are generated once, for both the schema and the fallback
+        legal_moves = list(self.board.legal_moves)
+        prompt = self._gemini_prompt()
+        config = self._gemini_config([move.uci() for move in legal_moves])
+
+        for attempt in range(retries):
+            try:
+                response = self.gemini_model.generate_content(
+                    prompt, generation_config=config
+                )
+            except Exception as e:
+                print(f" > Error requesting Gemini move: {e}")
+                continue
+
+            move = self._parse_gemini_reply(response)
+            if move is not None:
+                return move
+            break
+
+        return self._random_fallback_move(legal_moves)
 
     def play(self):
         """Play a full AI vs AI game."""
@@ -650,7 +1092,11 @@ class AIvsAIGame(ChessGame):
 
         try:
             while not self.is_game_over():
-                self.display_board()
+                if (
+                    self.display_every
+                    and len(self.board.move_stack) % self.display_every == 0
+                ):
+                    self.display_board()
 
                 if self.board.turn == self.stockfish_color:
                     print("Stockfish is thinking...")
@@ -661,33 +1107,134 @@ class AIvsAIGame(ChessGame):
                     move = self.get_gemini_move()
                     player = "Gemini"
 
-                san_move = self.make_move(move)
-                print(f"{player} played: {san_move} ({move.uci()})")
+                notation = self.make_move(move)
+                if self.record_san:
+                    print(f"{player} played: {notation} ({move.uci()})")
+                else:
+                    print(f"{player} played: {notation}")
 
             # Game over
             self.display_board()
-            self.display_move_history()
+            if self.record_san:
+                self.display_move_history()
             print("\n" + "=" * 50)
             print(f"🏁 GAME OVER - Result: {self.get_result()}")
             print("=" * 50)
 
-            # Set player names based on actual colors
-            stockfish_name = f"Stockfish Level {self.stockfish_skill}"
-            gemini_name = "Gemini 1.5 Flash"
-
-            if self.stockfish_color == chess.WHITE:
-                white_player = stockfish_name
-                black_player = gemini_name
-            else:
-                white_player = gemini_name
-                black_player = stockfish_name
-
-            self.save_to_pgn(
-                "ai_vs_ai_games.pgn",
-                white_player,
-                black_player,
-                "Cyberchess AI Training",
-            )
+            self.save_game()
 
         finally:
             self.stop_engine()
+
+    def player_names(self) -> Tuple[str, str]:
+        """Return the (white, black) player names for the PGN headers."""
+        stockfish_name = f"Stockfish Level {self.stockfish_skill}"
+        gemini_name = "Gemini 1.5 Flash"
+
+        if self.stockfish_color == chess.WHITE:
+            return stockfish_name, gemini_name
+        return gemini_name, stockfish_name
+
+    def save_game(self, sink: Optional[PgnSink] = None):
+        """Save the game to the AI training PGN file."""
+        white_player, black_player = self.player_names()
+
+        self.save_to_pgn(
+            "ai_vs_ai_games.pgn",
+            white_player,
+            black_player,
+            "Cyberchess AI Training",
+            sink=sink,
+        )
+
+
+def _run_games(args: tuple) -> List[str]:
+    """
+    Play AI vs AI games one after another in a worker and return their PGN
+    texts. The games share one Stockfish process, which is quit before the
+    worker returns; its thread would otherwise keep the worker from exiting.
+    """
+    n_games, game_args = args
+    try:
+        return [_run_one_game(game_args) for _ in range(n_games)]
+    finally:
+        close_shared_engines()
+
+
+def _run_one_game(args: tuple) -> str:
+    """Play one AI vs AI game without display and return its PGN text."""
+    stockfish_path, google_api_key, stockfish_skill, stockfish_color, model = args
+    game = AIvsAIGame(
+        stockfish_path,
+        google_api_key,
+        stockfish_skill,
+        stockfish_color,
+        share_engine=True,
+        record_san=False,
+        gemini_model=model,
+    )
+    game.start_engine()
+
+    try:
+        while not game.is_game_over():
+            if game.board.turn == game.stockfish_color:
+                move = game.get_stockfish_move()
+            else:
+                move = game.get_gemini_move()
+            game.make_move(move)
+    finally:
+        game.stop_engine()
+
+    print(f"🏁 Game over - Result: {game.get_result()}")
+    white_player, black_player = game.player_names()
+    return game.to_pgn(white_player, black_player, "Cyberchess AI Training")
+
+
+def run_training_batch(
+    n_games: int,
+    stockfish_path: Union[str, List[str]],
+    google_api_key: str,
+    stockfish_skill: int = 5,
+    stockfish_color: Optional[chess.Color] = None,
+    max_workers: Optional[int] = None,
+    pgn_path: str = "ai_vs_ai_games.pgn",
+    gemini_model=None,
+) -> int:
+    """
+    Play AI vs AI games in worker processes for training data generation.
+
+    The games are split evenly over the workers (one per CPU by default).
+    Each worker starts one Stockfish process and reuses it for all of its
+    games, so searches spread across the cores and the spawn and UCI
+    handshake are paid once per worker rather than once per game. Games are
+    appended to pgn_path in order, and the number of games written is
+    returned. stockfish_color and gemini_model are passed to each
+    AIvsAIGame; the model has to be picklable.
+    """
+    game_args = (
+        stockfish_path,
+        google_api_key,
+        stockfish_skill,
+        stockfish_color,
+        gemini_model,
+    )
+    workers = max(1, min(max_workers or os.cpu_count() or 1, n_games))
+    jobs = [
+        (n_games // workers + (i < n_games % workers), game_args)
+        for i in range(workers)
+    ]
+    saved = 0
+
+    # Workers are spawned rather than forked on every platform: the Gemini
+    # client's gRPC channels don't survive a fork, and each fresh interpreter
+    # seeds its own random colors and fallback moves
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor, PgnSink(pgn_path) as sink:
+        for pgn_texts in executor.map(_run_games, jobs):
+            for pgn_text in pgn_texts:
+                sink.write(pgn_text)
+                saved += 1
+
+    print(f"\n✅ {saved} games saved to '{pgn_path}'")
+    return saved
@@ -0,0 +1,31 @@
+"""
+JSON codec for Cyberchess online play.
+Shared by the multiplayer server and client: orjson when it is installed,
+otherwise the standard library json module.
+"""
+
+import json
+
+# orjson encodes/decodes several times faster than the stdlib json module
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class _OrjsonCodec:
+    """Stand-in for the json module, backed by orjson."""
+
+    @staticmethod
+    def dumps(obj, default=None, **kwargs) -> str:
+        return orjson.dumps(obj, default=default).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
+# Drop-in for the json module: dumps() returns str, loads() takes str or bytes
+JSON = _OrjsonCodec if ORJSON_AVAILABLE else json
@@ -4,8 +4,51 @@ Cyberchess Launcher
 Choose between CLI and Cyberpunk GUI interfaces.
 """
 
+import importlib
 import os
+import signal
 import sys
+import threading
+import traceback
+from typing import List, Optional
+
+# Subcommand entry points, imported on first use so the menu comes up
+# without pulling in tkinter, Flask or the engine modules
+_ENTRY_POINTS = {
+    "gui_main": ("cyberpunk_gui", "main"),
+    "cli_main": ("play", "main"),
+    "server_main": ("server", "main"),
+}
+
+
+def _entry_point(name: str):
+    """Import a subcommand entry point once and cache it on this module."""
+    entry_point = globals().get(name)
+    if entry_point is None:
+        module_name, attr = _ENTRY_POINTS[name]
+        entry_point = getattr(importlib.import_module(module_name), attr)
+        globals()[name] = entry_point
+    return entry_point
+
+
+def __getattr__(name: str):
+    """Expose the subcommand entry points as lazy module attributes (PEP 562)."""
+    if name in _ENTRY_POINTS:
+        return _entry_point(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _countdown_cancelled(seconds: float) -> bool:
+    """
+    Wait before launching, returning True if Ctrl+C was pressed meanwhile.
+    SIGINT sets an event instead of raising, so the wait ends immediately.
+    """
+    cancel = threading.Event()
+    previous_handler = signal.signal(signal.SIGINT, lambda *_: cancel.set())
+    try:
+        return cancel.wait(seconds)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
 
 
 def display_launcher_menu():
@@ -39,106 +82,102 @@ def display_launcher_menu():
     print("=" * 60)
 
 
-def main():
-    """Main launcher function."""
-    while True:
-        display_launcher_menu()
+_GUI_IMPORT_HINT = ["Make sure tkinter is installed (usually comes with Python)"]
+_SERVER_IMPORT_HINT = [
+    "Make sure Flask and Flask-SocketIO are installed:",
+    "  pip install flask flask-cors flask-socketio",
+]
 
-        choice = input("\n⚡ Enter your choice (1-5): ").strip()
 
-        if choice == "1":
-            print("\n🚀 Launching Cyberpunk GUI...")
-            print("=" * 60)
-            try:
-                # Import and run GUI
-                from cyberpunk_gui import main as gui_main
+def _run_entry_point(name: str, label: str, import_hint: Optional[List[str]] = None):
+    """
+    Run a subcommand, reporting any failure so the launcher can return to
+    the menu. Missing modules get the install hint when one is given.
+    """
+    try:
+        _entry_point(name)()
+    except ImportError as e:
+        if import_hint is None:
+            print(f"\n❌ Error launching {label}: {e}")
+            traceback.print_exc()
+            return
+        print(f"\n❌ Error: Could not load {label} module: {e}")
+        for line in import_hint:
+            print(line)
+    except Exception as e:
+        print(f"\n❌ Error launching {label}: {e}")
+        traceback.print_exc()
+
+
+def _launch_gui():
+    """Run the Cyberpunk GUI."""
+    print("\n🚀 Launching Cyberpunk GUI...")
+    print("=" * 60)
+    _run_entry_point("gui_main", "GUI", _GUI_IMPORT_HINT)
 
-                gui_main()
-            except ImportError as e:
-                print(f"\n❌ Error: Could not load GUI module: {e}")
-                print("Make sure tkinter is installed (usually comes with Python)")
-            except Exception as e:
-                print(f"\n❌ Error launching GUI: {e}")
-                import traceback
 
-                traceback.print_exc()
+def _launch_cli():
+    """Run the classic console interface."""
+    print("\n🚀 Launching Classic CLI...")
+    print("=" * 60)
+    _run_entry_point("cli_main", "CLI")
 
-            # Return to menu after GUI closes
-            continue
 
-        elif choice == "2":
-            print("\n🚀 Launching Classic CLI...")
-            print("=" * 60)
-            try:
-                # Import and run CLI
-                from play import main as cli_main
+def _launch_server():
+    """Run the online multiplayer server."""
+    print("\n🚀 Starting Online Multiplayer Server...")
+    print("=" * 60)
+    _run_entry_point("server_main", "server", _SERVER_IMPORT_HINT)
 
-                cli_main()
-            except Exception as e:
-                print(f"\n❌ Error launching CLI: {e}")
-                import traceback
 
-                traceback.print_exc()
+def _launch_mobile():
+    """Run the server for the mobile web interface, after a short countdown."""
+    print("\n🚀 Launching Mobile Web Interface...")
+    print("=" * 60)
+    print("\n📱 Mobile web interface available at:")
+    print("   http://localhost:5000")
+    if os.environ.get("CYBERCHESS_NO_COUNTDOWN") != "1":
+        print("\n⚠️  Starting server in 3 seconds...")
+        print("   Press Ctrl+C to cancel, or later to stop the server")
+        if _countdown_cancelled(3):
+            print("\n↩️  Cancelled, returning to menu")
+            return
+    _run_entry_point("server_main", "server", _SERVER_IMPORT_HINT)
+
+
+def _exit():
+    """Say goodbye; main() stops the menu loop after this."""
+    print("\n👋 Thanks for using Cyberchess! Goodbye!")
+    print("=" * 60)
 
-            # Return to menu after CLI exits
-            continue
 
-        elif choice == "3":
-            print("\n🚀 Starting Online Multiplayer Server...")
-            print("=" * 60)
-            try:
-                # Import and run server
-                from server import main as server_main
-
-                server_main()
-            except ImportError as e:
-                print(f"\n❌ Error: Could not load server module: {e}")
-                print("Make sure Flask and Flask-SocketIO are installed:")
-                print("  pip install flask flask-cors flask-socketio")
-            except Exception as e:
-                print(f"\n❌ Error launching server: {e}")
-                import traceback
-
-                traceback.print_exc()
-
-            # Return to menu after server stops
-            continue
+# Menu choices and their actions
+_DISPATCH = {
+    "1": _launch_gui,
+    "2": _launch_cli,
+    "3": _launch_server,
+    "4": _launch_mobile,
+    "5": _exit,
+}
 
-        elif choice == "4":
-            print("\n🚀 Launching Mobile Web Interface...")
-            print("=" * 60)
-            print("\n📱 Mobile web interface available at:")
-            print("   http://localhost:5000")
-            print("\n⚠️  Starting server in 3 seconds...")
-            print("   Press Ctrl+C to stop the server and return to menu")
-            import time
-
-            time.sleep(3)
-            try:
-                from server import main as server_main
-
-                server_main()
-            except ImportError as e:
-                print(f"\n❌ Error: Could not load server module: {e}")
-                print("Make sure Flask and Flask-SocketIO are installed:")
-                print("  pip install flask flask-cors flask-socketio")
-            except Exception as e:
-                print(f"\n❌ Error launching server: {e}")
-                import traceback
-
-                traceback.print_exc()
-
-            # Return to menu
-            continue
 
-        elif choice == "5":
-            print("\n👋 Thanks for using Cyberchess! Goodbye!")
-            print("=" * 60)
-            break
+def main():
+    """Main launcher function."""
+    while True:
+        display_launcher_menu()
 
-        else:
+        choice = input("\n⚡ Enter your choice (1-5): ").strip()
+
+        action = _DISPATCH.get(choice)
+        if action is None:
             print("\n❌ Invalid choice! Please enter 1, 2, 3, 4, or 5.")
             input("\nPress Enter to continue...")
+            continue
+
+        # Every subcommand returns to the menu when it finishes
+        action()
+        if action is _exit:
+            break
 
 
 if __name__ == "__main__":
@@ -3,12 +3,35 @@ Multiplayer client module for Cyberchess.
 Handles communication with the server for online play.
 """
 
-import json
-from typing import Callable, Optional
+import importlib.util
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 
 import chess
 import requests
 import socketio
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from json_codec import JSON as _JSON
+
+# Reconnect quickly after a transient drop, so moves don't stall for the
+# library's default one-second backoff
+_RECONNECT_OPTIONS = {
+    "reconnection": True,
+    "reconnection_attempts": 10,
+    "reconnection_delay": 0.1,
+    "reconnection_delay_max": 1.0,
+    "randomization_factor": 0.2,
+}
+
+# Connecting straight over WebSocket skips the long-polling handshake, but the
+# sync client can only do that when websocket-client is installed
+_SYNC_TRANSPORTS = (
+    ["websocket"] if importlib.util.find_spec("websocket") is not None else None
+)
 
 
 class MultiplayerClient:
@@ -18,7 +41,23 @@ class MultiplayerClient:
         """Initialize the multiplayer client."""
         self.server_url = server_url
         self.api_url = f"{server_url}/api"
-        self.sio = socketio.Client()
+        # python-socketio keeps the packet codec on its Packet classes, so
+        # json= switches every Socket.IO client and server in this process to
+        # _JSON, not just this one. That is fine here, since _JSON is a
+        # drop-in for the json module; the default codec is that module.
+        self.sio = socketio.Client(json=_JSON, **_RECONNECT_OPTIONS)
+
+        # One pooled HTTP session for every REST call, so repeated requests
+        # reuse the same keep-alive connection instead of reconnecting
+        self._http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=2, backoff_factor=0.1),
+        )
+        self._http.mount("http://", adapter)
+        self._http.mount("https://", adapter)
+        self._http.headers["Content-Type"] = "application/json"
 
         self.user_id = None
         self.username = None
@@ -31,70 +70,143 @@ class MultiplayerClient:
         self.on_game_over_callback: Optional[Callable] = None
         self.on_error_callback: Optional[Callable] = None
 
+        # Outgoing events go through an unbounded queue drained by one worker,
+        # started by connect(), so callers never block on emit and events
+        # reach the server in order. Futures still awaiting an ack are failed
+        # when the socket disconnects.
+        self._outbox: queue.Queue = queue.Queue()
+        self._pending: set = set()
+        self._pending_lock = threading.Lock()
+        self._sender: Optional[threading.Thread] = None
+
         # Setup event handlers
         self._setup_handlers()
 
+    def _drain_outbox(self):
+        """Emit queued events, resolving each future on the server's ack."""
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                break
+            event, payload, future = item
+            with self._pending_lock:
+                self._pending.add(future)
+            try:
+                self.sio.emit(
+                    event, payload, callback=lambda *ack, f=future: self._settle(f, ack)
+                )
+            except Exception as e:
+                print(f"❌ Failed to send {event}: {e}")
+                self._settle(future, error=e)
+
+    def _settle(self, future: Future, ack=None, error: Optional[Exception] = None):
+        """Resolve a pending future once, with the server's ack or an error."""
+        with self._pending_lock:
+            if future not in self._pending:
+                return
+            self._pending.discard(future)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(ack)
+
+    def _fail_pending(self, reason: str):
+        """Fail every future still waiting for an ack."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        for future in pending:
+            future.set_exception(ConnectionError(reason))
+
+    def _send(self, event: str, payload: dict) -> Future:
+        """
+        Queue an event for the server and return a future for its ack.
+        The future fails with the emit error, or with ConnectionError if the
+        socket disconnects before the server acknowledges the event.
+        """
+        future: Future = Future()
+        self._outbox.put((event, payload, future))
+        return future
+
     def _setup_handlers(self):
         """Setup WebSocket event handlers."""
-
-        @self.sio.on("connected")
-        def on_connected(data):
-            print(f"✅ {data['message']}")
-
-        @self.sio.on("game_joined")
-        def on_game_joined(data):
-            self.game_session_id = data["session_id"]
-            self.player_color = data["color"]
-            print(f"✅ Joined game as {self.player_color}")
-
-        @self.sio.on("move_made")
-        def on_move_made(data):
-            if self.on_move_callback:
-                self.on_move_callback(data)
-
-        @self.sio.on("player_resigned")
-        def on_player_resigned(data):
-            print(f"⚠️ Player resigned. Result: {data['result']}")
-            if self.on_game_over_callback:
-                self.on_game_over_callback(data)
-
-        @self.sio.on("error")
-        def on_error(data):
-            print(f"❌ Error: {data['message']}")
-            if self.on_error_callback:
-                self.on_error_callback(data)
+        self.sio.on("connected", self._on_connected)
+        self.sio.on("disconnect", self._on_disconnect)
+        self.sio.on("game_joined", self._on_game_joined)
+        self.sio.on("move_made", self._on_move_made)
+        self.sio.on("player_resigned", self._on_player_resigned)
+        self.sio.on("error", self._on_error)
+
+    def _on_connected(self, data):
+        print(f"✅ {data['message']}")
+
+    def _on_disconnect(self, *args):
+        self._fail_pending("Disconnected before the server acknowledged the event")
+
+    def _on_game_joined(self, data):
+        self.game_session_id = data["session_id"]
+        self.player_color = data["color"]
+        print(f"✅ Joined game as {self.player_color}")
+
+    def _on_move_made(self, data):
+        if self.on_move_callback:
+            self.on_move_callback(data)
+
+    def _on_player_resigned(self, data):
+        print(f"⚠️ Player resigned. Result: {data['result']}")
+        if self.on_game_over_callback:
+            self.on_game_over_callback(data)
+
+    def _on_error(self, data):
+        print(f"❌ Error: {data['message']}")
+        if self.on_error_callback:
+            self.on_error_callback(data)
 
     def connect(self) -> bool:
         """Connect to the server."""
         try:
-            self.sio.connect(self.server_url)
-            return True
+            self.sio.connect(self.server_url, transports=_SYNC_TRANSPORTS)
         except Exception as e:
             print(f"❌ Failed to connect to server: {e}")
             return False
 
+        if self._sender is None:
+            self._sender = threading.Thread(target=self._drain_outbox, daemon=True)
+            self._sender.start()
+        return True
+
     def disconnect(self):
         """Disconnect from the server."""
         if self.sio.connected:
             self.sio.disconnect()
 
+    def close(self):
+        """Flush queued events, disconnect and release HTTP connections."""
+        if self._sender is not None:
+            self._outbox.put(None)
+            self._sender.join(timeout=5)
+            self._sender = None
+        self._http.close()
+        self.disconnect()
+
     def register(
         self, username: str, password: str, email: Optional[str] = None
     ) -> bool:
         """Register a new user account."""
         try:
-            response = requests.post(
+            response = self._http.post(
                 f"{self.api_url}/register",
-                json={"username": username, "password": password, "email": email},
+                data=_JSON.dumps(
+                    {"username": username, "password": password, "email": email}
+                ),
                 timeout=10,
             )
 
             if response.status_code == 200:
-                data = response.json()
+                data = _JSON.loads(response.content)
                 print(f"✅ Registration successful! User ID: {data['user_id']}")
                 return True
             else:
-                error = response.json().get("error", "Unknown error")
+                error = _JSON.loads(response.content).get("error", "Unknown error")
                 print(f"❌ Registration failed: {error}")
                 return False
         except Exception as e:
@@ -104,14 +216,14 @@ class MultiplayerClient:
     def login(self, username: str, password: str) -> bool:
         """Login to the server."""
         try:
-            response = requests.post(
+            response = self._http.post(
                 f"{self.api_url}/login",
-                json={"username": username, "password": password},
+                data=_JSON.dumps({"username": username, "password": password}),
                 timeout=10,
             )
 
             if response.status_code == 200:
-                data = response.json()
+                data = _JSON.loads(response.content)
                 self.user_id = data["user_id"]
                 self.username = data["username"]
                 self.session_token = data["session_token"]
@@ -120,7 +232,7 @@ class MultiplayerClient:
                 )
                 return True
             else:
-                error = response.json().get("error", "Unknown error")
+                error = _JSON.loads(response.content).get("error", "Unknown error")
                 print(f"❌ Login failed: {error}")
                 return False
         except Exception as e:
@@ -137,9 +249,9 @@ class MultiplayerClient:
             return None
 
         try:
-            response = requests.get(f"{self.api_url}/user/{user_id}", timeout=10)
+            response = self._http.get(f"{self.api_url}/user/{user_id}", timeout=10)
             if response.status_code == 200:
-                return response.json()
+                return _JSON.loads(response.content)
             else:
                 print(f"❌ Failed to get user profile")
                 return None
@@ -150,11 +262,11 @@ class MultiplayerClient:
     def get_leaderboard(self, limit: int = 10) -> list:
         """Get the leaderboard."""
         try:
-            response = requests.get(
+            response = self._http.get(
                 f"{self.api_url}/leaderboard?limit={limit}", timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return _JSON.loads(response.content)
             else:
                 return []
         except Exception as e:
@@ -171,17 +283,31 @@ class MultiplayerClient:
             return []
 
         try:
-            response = requests.get(
+            response = self._http.get(
                 f"{self.api_url}/user/{user_id}/games?limit={limit}", timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return _JSON.loads(response.content)
             else:
                 return []
         except Exception as e:
             print(f"❌ Error getting games: {e}")
             return []
 
+    def fetch_dashboard(self, limit: int = 10) -> Tuple[Optional[dict], list, list]:
+        """
+        Fetch the profile, leaderboard and game history concurrently.
+        Returns (profile, leaderboard, games); the three requests run in
+        parallel, so the wait is roughly the slowest of them rather than the
+        sum. Sharing self._http across the workers is acceptable because its
+        adapter keeps up to 20 connections per host, more than the 3 needed.
+        """
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            profile = executor.submit(self.get_user_profile)
+            leaderboard = executor.submit(self.get_leaderboard, limit)
+            games = executor.submit(self.get_user_games, None, limit)
+            return profile.result(), leaderboard.result(), games.result()
+
     def join_matchmaking(self, time_control: str = "blitz") -> Optional[dict]:
         """Join matchmaking queue to find an opponent."""
         if not self.user_id:
@@ -189,14 +315,16 @@ class MultiplayerClient:
             return None
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 f"{self.api_url}/matchmaking/join",
-                json={"user_id": self.user_id, "time_control": time_control},
+                data=_JSON.dumps(
+                    {"user_id": self.user_id, "time_control": time_control}
+                ),
                 timeout=10,
             )
 
             if response.status_code == 200:
-                data = response.json()
+                data = _JSON.loads(response.content)
                 if data.get("matched"):
                     print(f"✅ Match found! Session: {data['session_id']}")
                     self.game_session_id = data["session_id"]
@@ -206,7 +334,7 @@ class MultiplayerClient:
                     print("⏳ Waiting for opponent...")
                     return data
             else:
-                error = response.json().get("error", "Unknown error")
+                error = _JSON.loads(response.content).get("error", "Unknown error")
                 print(f"❌ Matchmaking failed: {error}")
                 return None
         except Exception as e:
@@ -219,9 +347,9 @@ class MultiplayerClient:
             return False
 
         try:
-            response = requests.post(
+            response = self._http.post(
                 f"{self.api_url}/matchmaking/leave",
-                json={"user_id": self.user_id},
+                data=_JSON.dumps({"user_id": self.user_id}),
                 timeout=10,
             )
             return response.status_code == 200
@@ -229,7 +357,7 @@ class MultiplayerClient:
             print(f"❌ Error leaving queue: {e}")
             return False
 
-    def join_game(self, session_id: Optional[str] = None):
+    def join_game(self, session_id: Optional[str] = None) -> Optional[Future]:
         """Join a game session."""
         if session_id:
             self.game_session_id = session_id
@@ -238,7 +366,7 @@ class MultiplayerClient:
             print("❌ No game session or not logged in")
             return
 
-        self.sio.emit(
+        return self._send(
             "join_game",
             {
                 "session_id": self.game_session_id,
@@ -249,7 +377,7 @@ class MultiplayerClient:
     def leave_game(self):
         """Leave the current game session."""
         if self.game_session_id and self.user_id:
-            self.sio.emit(
+            self._send(
                 "leave_game",
                 {
                     "session_id": self.game_session_id,
@@ -259,13 +387,16 @@ class MultiplayerClient:
             self.game_session_id = None
             self.player_color = None
 
-    def make_move(self, move_uci: str):
-        """Send a move to the server."""
+    def make_move(self, move_uci: str) -> Optional[Future]:
+        """
+        Send a move to the server without waiting for it to go out.
+        Returns a Future that resolves with the server's acknowledgement.
+        """
         if not self.game_session_id or not self.user_id:
             print("❌ No active game session")
             return
 
-        self.sio.emit(
+        return self._send(
             "make_move",
             {
                 "session_id": self.game_session_id,
@@ -274,13 +405,13 @@ class MultiplayerClient:
             },
         )
 
-    def resign(self):
+    def resign(self) -> Optional[Future]:
         """Resign from the current game."""
         if not self.game_session_id or not self.user_id:
             print("❌ No active game session")
             return
 
-        self.sio.emit(
+        return self._send(
             "resign",
             {
                 "session_id": self.game_session_id,
@@ -298,9 +429,9 @@ class MultiplayerClient:
             return None
 
         try:
-            response = requests.get(f"{self.api_url}/game/{session_id}", timeout=10)
+            response = self._http.get(f"{self.api_url}/game/{session_id}", timeout=10)
             if response.status_code == 200:
-                return response.json()
+                return _JSON.loads(response.content)
             else:
                 return None
         except Exception as e:
@@ -327,8 +458,8 @@ if __name__ == "__main__":
         client.register(username, password)
 
     if client.login(username, password):
-        # Get profile
-        profile = client.get_user_profile()
+        # Get profile and leaderboard in one round trip
+        profile, leaderboard, _ = client.fetch_dashboard()
         if profile:
             print(f"\nProfile: {profile['username']}")
             print(f"Rating: {profile['rating']}")
@@ -336,7 +467,7 @@ if __name__ == "__main__":
 
         # Show leaderboard
         print("\n📊 Leaderboard:")
-        for i, player in enumerate(client.get_leaderboard(), 1):
+        for i, player in enumerate(leaderboard, 1):
             print(f"{i}. {player['username']}: {player['rating']}")
 
         # Join matchmaking
@@ -351,4 +482,4 @@ if __name__ == "__main__":
                 input("Press Enter to leave game...")
                 client.leave_game()
 
-    client.disconnect()
+    client.close()
@@ -5,15 +5,118 @@ Provides common chess openings and their variations.
 
 import random
 import sys
+from types import MappingProxyType
 from typing import Dict, List, Optional, Tuple
 
 import chess
-
-# Configure stdout/stderr to use UTF-8 encoding on Windows
-if sys.stdout.encoding != "utf-8":
-    sys.stdout.reconfigure(encoding="utf-8")
-if sys.stderr.encoding != "utf-8":
-    sys.stderr.reconfigure(encoding="utf-8")
+import chess.polyglot
+
+# Starting position that boards are copied from
+_STARTING_BOARD = chess.Board()
+
+
+# Book lines keyed by their UCI moves. Read-only, as it is shared by every
+# OpeningBook.
+_OPENINGS = MappingProxyType(
+    {
+        # Italian Game
+        "e2e4 e7e5 g1f3 b8c6 f1c4": {
+            "name": "Italian Game",
+            "eco": "C50",
+            "responses": ["g8f6", "f8c5", "d7d6"],
+        },
+        # Ruy Lopez
+        "e2e4 e7e5 g1f3 b8c6 f1b5": {
+            "name": "Ruy Lopez (Spanish Opening)",
+            "eco": "C60",
+            "responses": ["a7a6", "g8f6", "f8c5"],
+        },
+        # Sicilian Defense
+        "e2e4 c7c5": {
+            "name": "Sicilian Defense",
+            "eco": "B20",
+            "responses": ["g1f3", "b1c3", "d2d4"],
+        },
+        # French Defense
+        "e2e4 e7e6": {
+            "name": "French Defense",
+            "eco": "C00",
+            "responses": ["d2d4", "d2d3", "g1f3"],
+        },
+        # Caro-Kann Defense
+        "e2e4 c7c6": {
+            "name": "Caro-Kann Defense",
+            "eco": "B10",
+            "responses": ["d2d4", "b1c3", "g1f3"],
+        },
+        # Queen's Gambit
+        "d2d4 d7d5 c2c4": {
+            "name": "Queen's Gambit",
+            "eco": "D06",
+            "responses": ["e7e6", "c7c6", "d5c4"],
+        },
+        # King's Indian Defense
+        "d2d4 g8f6 c2c4 g7g6": {
+            "name": "King's Indian Defense",
+            "eco": "E60",
+            "responses": ["b1c3", "g1f3", "g2g3"],
+        },
+        # English Opening
+        "c2c4": {
+            "name": "English Opening",
+            "eco": "A10",
+            "responses": ["e7e5", "g8f6", "c7c5"],
+        },
+        # Nimzo-Indian Defense
+        "d2d4 g8f6 c2c4 e7e6 b1c3 f8b4": {
+            "name": "Nimzo-Indian Defense",
+            "eco": "E20",
+            "responses": ["d1c2", "e2e3", "g1f3"],
+        },
+        # Scandinavian Defense
+        "e2e4 d7d5": {
+            "name": "Scandinavian Defense",
+            "eco": "B01",
+            "responses": ["e4d5", "b1c3", "e4e5"],
+        },
+        # Pirc Defense
+        "e2e4 d7d6 d2d4 g8f6 b1c3 g7g6": {
+            "name": "Pirc Defense",
+            "eco": "B07",
+            "responses": ["f1e2", "g1f3", "f2f4"],
+        },
+        # London System
+        "d2d4 d7d5 g1f3 g8f6 c1f4": {
+            "name": "London System",
+            "eco": "D02",
+            "responses": ["c7c5", "e7e6", "c7c6"],
+        },
+    }
+)
+
+
+def _build_indexes(openings):
+    """
+    Index every book line by the position it reaches, and as a trie keyed by
+    Move. python-chess keeps the transposition key up to date on push/pop, so
+    probing an exact book position is a single dict lookup; games that have
+    left the book are matched by walking their move stack down the trie.
+    """
+    by_key = {}
+    trie = {"_info": None, "_children": {}}
+    for opening_moves, opening_info in openings.items():
+        board = _STARTING_BOARD.copy(stack=False)
+        node = trie
+        for move_uci in opening_moves.split():
+            move = chess.Move.from_uci(move_uci)
+            board.push(move)
+            node = node["_children"].setdefault(move, {"_info": None, "_children": {}})
+        node["_info"] = opening_info
+        by_key[board._transposition_key()] = (
+            opening_info,
+            [chess.Move.from_uci(move_uci) for move_uci in opening_info["responses"]],
+        )
+    return by_key, trie
 
 
 class OpeningBook:
@@ -21,82 +124,38 @@ class OpeningBook:
     Chess opening book with common openings and their main variations.
     """
 
-    def __init__(self):
-        """Initialize the opening book with common openings."""
-        self.openings = {
-            # Italian Game
-            "e2e4 e7e5 g1f3 b8c6 f1c4": {
-                "name": "Italian Game",
-                "eco": "C50",
-                "responses": ["g8f6", "f8c5", "d7d6"],
-            },
-            # Ruy Lopez
-            "e2e4 e7e5 g1f3 b8c6 f1b5": {
-                "name": "Ruy Lopez (Spanish Opening)",
-                "eco": "C60",
-                "responses": ["a7a6", "g8f6", "f8c5"],
-            },
-            # Sicilian Defense
-            "e2e4 c7c5": {
-                "name": "Sicilian Defense",
-                "eco": "B20",
-                "responses": ["g1f3", "b1c3", "d2d4"],
-            },
-            # French Defense
-            "e2e4 e7e6": {
-                "name": "French Defense",
-                "eco": "C00",
-                "responses": ["d2d4", "d2d3", "g1f3"],
-            },
-            # Caro-Kann Defense
-            "e2e4 c7c6": {
-                "name": "Caro-Kann Defense",
-                "eco": "B10",
-                "responses": ["d2d4", "b1c3", "g1f3"],
-            },
-            # Queen's Gambit
-            "d2d4 d7d5 c2c4": {
-                "name": "Queen's Gambit",
-                "eco": "D06",
-                "responses": ["e7e6", "c7c6", "d5c4"],
-            },
-            # King's Indian Defense
-            "d2d4 g8f6 c2c4 g7g6": {
-                "name": "King's Indian Defense",
-                "eco": "E60",
-                "responses": ["b1c3", "g1f3", "g2g3"],
-            },
-            # English Opening
-            "c2c4": {
-                "name": "English Opening",
-                "eco": "A10",
-                "responses": ["e7e5", "g8f6", "c7c5"],
-            },
-            # Nimzo-Indian Defense
-            "d2d4 g8f6 c2c4 e7e6 b1c3 f8b4": {
-                "name": "Nimzo-Indian Defense",
-                "eco": "E20",
-                "responses": ["d1c2", "e2e3", "g1f3"],
-            },
-            # Scandinavian Defense
-            "e2e4 d7d5": {
-                "name": "Scandinavian Defense",
-                "eco": "B01",
-                "responses": ["e4d5", "b1c3", "e4e5"],
-            },
-            # Pirc Defense
-            "e2e4 d7d6 d2d4 g8f6 b1c3 g7g6": {
-                "name": "Pirc Defense",
-                "eco": "B07",
-                "responses": ["f1e2", "g1f3", "f2f4"],
-            },
-            # London System
-            "d2d4 d7d5 g1f3 g8f6 c1f4": {
-                "name": "London System",
-                "eco": "D02",
-                "responses": ["c7c5", "e7e6", "c7c6"],
-            },
-        }
+    # Reference data and its indexes are shared by every instance
+    openings = _OPENINGS
+    _by_key, _trie = _build_indexes(_OPENINGS)
+
+    def __init__(self, polyglot_path: Optional[str] = None):
+        """
+        Initialize the opening book.
+
+        Args:
+            polyglot_path: Optional Polyglot .bin book. When given, book moves
+                come from it first (weighted by its entries), falling back to
+                the built-in responses; opening names still come from the
+                built-in lines.
+        """
+        # Each book draws from its own generator, so concurrent books don't
+        # contend on the global one and tests can seed a book on its own
+        self._rng = random.Random()
+
+        # Polyglot books are memory-mapped and probed by Zobrist hash
+        self._polyglot = (
+            chess.polyglot.open_reader(polyglot_path) if polyglot_path else None
+        )
+
+    def close(self) -> None:
+        """Close the Polyglot book, if one is open."""
+        if self._polyglot is not None:
+            self._polyglot.close()
+            self._polyglot = None
+
+    def seed(self, seed) -> None:
+        """Seed the book's move choice, for reproducible suggestions."""
+        self._rng.seed(seed)
 
     def get_opening_moves(self, board: chess.Board) -> List[str]:
         """
@@ -109,36 +168,74 @@ class OpeningBook:
         Identify the opening based on the current board position.
         Returns dict with 'name' and 'eco' code if found, None otherwise.
         """
-        move_sequence = " ".join(self.get_opening_moves(board))
-
-        # Check for exact matches or prefixes
-        for opening_moves, opening_info in self.openings.items():
-            if move_sequence == opening_moves or move_sequence.startswith(
-                opening_moves + " "
-            ):
-                return {"name": opening_info["name"], "eco": opening_info["eco"]}
-
-        return None
+        return self.probe(board, suggest=False)[0]
 
     def suggest_opening_move(self, board: chess.Board) -> Optional[chess.Move]:
         """
         Suggest a book move based on the current position.
         Returns a Move object if a book move is found, None otherwise.
         """
-        move_sequence = " ".join(self.get_opening_moves(board))
-
-        # Check if current position matches an opening
-        for opening_moves, opening_info in self.openings.items():
-            if move_sequence == opening_moves:
-                # We're at a known position, suggest one of the responses
-                responses = opening_info["responses"]
-                move_uci = random.choice(responses)
-                try:
-                    move = chess.Move.from_uci(move_uci)
-                    if move in board.legal_moves:
-                        return move
-                except:
-                    pass
+        move = self._polyglot_move(board)
+        if move is not None:
+            return move
+
+        entry = self._by_key.get(board._transposition_key())
+        if entry is None:
+            return None
+        return self._pick_response(board, entry[1])
+
+    def probe(
+        self, board: chess.Board, suggest: bool = True
+    ) -> Tuple[Optional[Dict[str, str]], Optional[chess.Move]]:
+        """
+        Look the position up in the book once, for callers that want both
+        the opening name and a book move.
+        Returns (opening, move) as identify_opening and suggest_opening_move
+        would; either may be None.
+        """
+        # Exact book positions (including transpositions) are a single probe
+        entry = self._by_key.get(board._transposition_key())
+        if entry is not None:
+            opening_info, responses = entry
+            move = None
+            if suggest:
+                move = self._polyglot_move(board) or self._pick_response(
+                    board, responses
+                )
+            return {"name": opening_info["name"], "eco": opening_info["eco"]}, move
+
+        # Otherwise follow the game through the trie and report the deepest
+        # book line it passed through
+        opening_info = None
+        node = self._trie
+        for move in board.move_stack:
+            node = node["_children"].get(move)
+            if node is None:
+                break
+            if node["_info"] is not None:
+                opening_info = node["_info"]
+
+        move = self._polyglot_move(board) if suggest else None
+        if opening_info is None:
+            return None, move
+        return {"name": opening_info["name"], "eco": opening_info["eco"]}, move
+
+    def _polyglot_move(self, board: chess.Board) -> Optional[chess.Move]:
+        """Pick a weighted move from the Polyglot book, if there is one."""
+        if self._polyglot is None:
+            return None
+        try:
+            return self._polyglot.weighted_choice(board, random=self._rng).move
+        except IndexError:
+            return None
+
+    def _pick_response(
+        self, board: chess.Board, responses: List[chess.Move]
+    ) -> Optional[chess.Move]:
+        """Pick one of the pre-parsed book responses if it is legal here."""
+        move = self._rng.choice(responses)
+        if board.is_legal(move):
+            return move
 
         return None
 
@@ -147,16 +244,7 @@ class OpeningBook:
         Get a list of all openings in the book.
         Returns list of tuples: (name, eco_code)
         """
-        openings_list = []
-        seen = set()
-
-        for opening_info in self.openings.values():
-            key = (opening_info["name"], opening_info["eco"])
-            if key not in seen:
-                openings_list.append(key)
-                seen.add(key)
-
-        return sorted(openings_list)
+        return sorted({(info["name"], info["eco"]) for info in self.openings.values()})
 
     def display_opening_info(self, board: chess.Board):
         """
@@ -185,13 +273,11 @@ def demo_opening_book():
 
     # Test Italian Game
     print("\n\nTesting Italian Game:")
-    board = chess.Board()
+    board = _STARTING_BOARD.copy(stack=False)
 
     moves = ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4"]
     for move_uci in moves:
-        move = chess.Move.from_uci(move_uci)
-        san = board.san(move)
-        board.push(move)
+        san = board.san_and_push(chess.Move.from_uci(move_uci))
         print(f"  {san}", end=" ")
 
     print("\n")
@@ -203,13 +289,11 @@ def demo_opening_book():
 
     # Test Sicilian Defense
     print("\n\nTesting Sicilian Defense:")
-    board2 = chess.Board()
+    board2 = _STARTING_BOARD.copy(stack=False)
 
     moves2 = ["e2e4", "c7c5"]
     for move_uci in moves2:
-        move = chess.Move.from_uci(move_uci)
-        san = board2.san(move)
-        board2.push(move)
+        san = board2.san_and_push(chess.Move.from_uci(move_uci))
         print(f"  {san}", end=" ")
 
     print("\n")
@@ -223,4 +307,11 @@ def demo_opening_book():
 
 
 if __name__ == "__main__":
+    # Configure stdout/stderr to use UTF-8 encoding on Windows. Only the demo
+    # needs this; importers configure their own streams.
+    if sys.stdout.encoding != "utf-8":
+        sys.stdout.reconfigure(encoding="utf-8")
+    if sys.stderr.encoding != "utf-8":
+        sys.stderr.reconfigure(encoding="utf-8")
+
     demo_opening_book()
@@ -8,10 +8,7 @@ import os
 import sys
 
 import chess
-
-from game_modes import AIvsAIGame, PlayerVsComputerGame, PlayerVsPlayerGame
-from opening_book import OpeningBook
-from puzzles import PuzzleTrainer
+import chess.engine
 
 # Configure stdout/stderr to use UTF-8 encoding on Windows
 if sys.stdout.encoding != "utf-8":
@@ -22,8 +19,121 @@ if sys.stderr.encoding != "utf-8":
 
 # --- CONFIGURATION ---
 # Set these to your actual paths/keys
-STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH", "YOUR_STOCKFISH_PATH_HERE")
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", "YOUR_GEMINI_API_KEY_HERE")
+_STOCKFISH_PLACEHOLDER = "YOUR_STOCKFISH_PATH_HERE"
+_GEMINI_PLACEHOLDER = "YOUR_GEMINI_API_KEY_HERE"
+STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH", _STOCKFISH_PLACEHOLDER)
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY", _GEMINI_PLACEHOLDER)
+# Optional Polyglot (.bin) opening book for the opening explorer
+POLYGLOT_BOOK_PATH = os.environ.get("CYBERCHESS_POLYGLOT_BOOK", "")
+
+
+# Static screens are assembled once and printed with a single write each
+_WELCOME_BANNER = "\n".join(
+    [
+        "\n" + "♔" * 50,
+        "Welcome to Cyberchess!",
+        "A modern chess platform with multiple game modes",
+        "♔" * 50,
+    ]
+)
+
+_MENU_SCREEN = "\n".join(
+    [
+        "\n" + "=" * 50,
+        "♔♕♖♗♘♙  CYBERCHESS - MAIN MENU  ♟♞♝♜♛♚",
+        "=" * 50,
+        "\nSelect a game mode:",
+        "1. Player vs Player",
+        "2. Player vs Computer",
+        "3. AI vs AI (Stockfish vs Gemini)",
+        "4. Online Multiplayer",
+        "5. Puzzle Trainer",
+        "6. Opening Book Explorer",
+        "7. About",
+        "8. Exit",
+        "=" * 50,
+    ]
+)
+
+_ABOUT_SCREEN = "\n".join(
+    [
+        "\n" + "=" * 60,
+        "♔♕♖♗♘♙  ABOUT CYBERCHESS  ♟♞♝♜♛♚",
+        "=" * 60,
+        "\n📋 APPLICATION INFO",
+        "  Name:        Cyberchess (CC)",
+        "  Version:     0.4.0",
+        "  Description: A modern chess platform with multiple game modes",
+        "\n✨ FEATURES",
+        "  • Full chess rules implementation",
+        "  • Player vs Player mode",
+        "  • Player vs Computer (Stockfish AI)",
+        "  • AI vs AI (Stockfish vs Gemini)",
+        "  • Online Multiplayer with user accounts",
+        "  • Rating system (Elo-based)",
+        "  • Mobile-responsive web interface",
+        "  • Chess puzzle trainer with 8+ tactical puzzles",
+        "  • Opening book with 12+ popular openings",
+        "  • Time controls (Blitz, Rapid, Classical, Custom)",
+        "  • Post-game engine analysis",
+        "  • PGN import/export",
+        "\n🔧 TECHNOLOGY STACK",
+        "  • Language: Python 3.7+",
+        "  • Chess Library: python-chess",
+        "  • AI Engine: Stockfish",
+        "  • AI Integration: Google Gemini 1.5 Flash",
+        "\n👥 PROJECT",
+        "  • Repository: https://github.com/GizzZmo/CC",
+        "  • Issues: https://github.com/GizzZmo/CC/issues",
+        "  • Discussions: https://github.com/GizzZmo/CC/discussions",
+        "\n📄 LICENSE",
+        "  • License information will be specified as development progresses",
+        "\n💡 ACKNOWLEDGMENTS",
+        "  • Chess programming community for insights and best practices",
+        "  • Open source chess engines and libraries for inspiration",
+        "  • All contributors who help make this project better",
+        "\n" + "=" * 60,
+        "Status: 🎉 Phase 3 & 4 Complete - Advanced Features Implemented!",
+        "Last Updated: December 2025",
+        "=" * 60,
+    ]
+)
+
+# Accepted answers at the menu prompts
+_MENU_CHOICES = frozenset("12345678")
+_OPTION_CHOICES = frozenset("123")
+_WHITE_CHOICES = frozenset({"w", "white"})
+_BLACK_CHOICES = frozenset({"b", "black"})
+
+
+# The opening book and puzzle trainer are built on first use and kept for
+# later visits to their menus
+_BOOK = None
+_TRAINER = None
+
+
+def _get_book():
+    """Return the shared opening book, creating it on first use."""
+    global _BOOK
+    if _BOOK is None:
+        from opening_book import OpeningBook
+
+        polyglot_path = POLYGLOT_BOOK_PATH
+        if polyglot_path and not os.path.exists(polyglot_path):
+            print(f"⚠️  Polyglot book not found at {polyglot_path}")
+            polyglot_path = None
+        _BOOK = OpeningBook(polyglot_path or None)
+    return _BOOK
+
+
+def _get_trainer():
+    """Return the shared puzzle trainer, creating it on first use."""
+    global _TRAINER
+    if _TRAINER is None:
+        from puzzles import PuzzleTrainer
+
+        _TRAINER = PuzzleTrainer()
+    return _TRAINER
 
 
 def get_board_theme():
@@ -47,39 +157,34 @@ def get_board_theme():
 
 def display_menu():
     """Display the main menu."""
-    print("\n" + "=" * 50)
-    print("♔♕♖♗♘♙  CYBERCHESS - MAIN MENU  ♟♞♝♜♛♚")
-    print("=" * 50)
-    print("\nSelect a game mode:")
-    print("1. Player vs Player")
-    print("2. Player vs Computer")
-    print("3. AI vs AI (Stockfish vs Gemini)")
-    print("4. Online Multiplayer")
-    print("5. Puzzle Trainer")
-    print("6. Opening Book Explorer")
-    print("7. About")
-    print("8. Exit")
-    print("=" * 50)
+    print(_MENU_SCREEN)
 
 
 def get_user_choice():
     """Get user's menu choice."""
     while True:
         choice = input("\nEnter your choice (1-8): ").strip()
-        if choice in ["1", "2", "3", "4", "5", "6", "7", "8"]:
+        if choice in _MENU_CHOICES:
             return choice
         print("❌ Invalid choice! Please enter 1, 2, 3, 4, 5, 6, 7, or 8.")
 
 
+_gemini_warning_shown = False
+
+
 def check_configuration():
     """Check if required configuration is set."""
-    if STOCKFISH_PATH == "YOUR_STOCKFISH_PATH_HERE":
+    global _gemini_warning_shown
+
+    if STOCKFISH_PATH == _STOCKFISH_PLACEHOLDER:
         print("\n⚠️  WARNING: STOCKFISH_PATH not configured!")
         print("Please set the STOCKFISH_PATH environment variable or edit play.py")
         print("Download Stockfish from: https://stockfishchess.org/download/")
         return False
 
-    if GOOGLE_API_KEY == "YOUR_GEMINI_API_KEY_HERE":
+    # The Gemini key is optional, so only mention it the first time
+    if GOOGLE_API_KEY == _GEMINI_PLACEHOLDER and not _gemini_warning_shown:
+        _gemini_warning_shown = True
         print("\n⚠️  WARNING: GOOGLE_API_KEY not configured!")
         print("This is only required for AI vs AI mode.")
         print("Get your API key from: https://makersuite.google.com/app/apikey")
@@ -89,6 +194,8 @@ def check_configuration():
 
 def play_pvp():
     """Start a Player vs Player game."""
+    from game_modes import PlayerVsPlayerGame
+
     print("\n" + "=" * 50)
     print("PLAYER VS PLAYER SETUP")
     print("=" * 50)
@@ -141,6 +248,8 @@ def play_pvp():
 
 def play_pvc():
     """Start a Player vs Computer game."""
+    from game_modes import PlayerVsComputerGame
+
     if not check_configuration():
         return
 
@@ -156,10 +265,10 @@ def play_pvc():
         color_choice = (
             input("\nDo you want to play as White or Black? (w/b): ").strip().lower()
         )
-        if color_choice in ["w", "white"]:
+        if color_choice in _WHITE_CHOICES:
             player_color = chess.WHITE
             break
-        elif color_choice in ["b", "black"]:
+        elif color_choice in _BLACK_CHOICES:
             player_color = chess.BLACK
             break
         else:
@@ -223,11 +332,13 @@ def play_pvc():
 
 
 def play_ai_vs_ai():
-    """Start an AI vs AI game."""
+    """Start an AI vs AI game, or a batch of them."""
+    from game_modes import AIvsAIGame, run_training_batch
+
     if not check_configuration():
         return
 
-    if GOOGLE_API_KEY == "YOUR_GEMINI_API_KEY_HERE":
+    if GOOGLE_API_KEY == _GEMINI_PLACEHOLDER:
         print("\n❌ ERROR: GOOGLE_API_KEY must be configured for AI vs AI mode.")
         return
 
@@ -276,8 +387,46 @@ def play_ai_vs_ai():
         else:
             print("❌ Invalid choice! Enter 1, 2, or 3.")
 
+    # Choose how many games to play
+    while True:
+        games = input("\nHow many games? (default=1): ").strip()
+        if not games:
+            num_games = 1
+            break
+        if games.isdigit() and int(games) > 0:
+            num_games = int(games)
+            break
+        print("❌ Please enter a positive number.")
+
+    # Several games are played without display, side by side in worker
+    # processes, and appended to the training PGN file
+    if num_games > 1:
+        print(f"\n🤖 Playing {num_games} games in parallel...")
+        run_training_batch(
+            num_games, STOCKFISH_PATH, GOOGLE_API_KEY, skill_level, stockfish_color
+        )
+        return
+
+    # Redrawing the board after every ply dominates fast games
+    while True:
+        every = input(
+            "\nShow the board every how many plies? (default=1, 0=only at the end): "
+        ).strip()
+        if not every:
+            display_every = 1
+            break
+        if every.isdigit():
+            display_every = int(every)
+            break
+        print("❌ Please enter 0 or a positive number.")
+
     game = AIvsAIGame(
-        STOCKFISH_PATH, GOOGLE_API_KEY, skill_level, stockfish_color, theme=theme
+        STOCKFISH_PATH,
+        GOOGLE_API_KEY,
+        skill_level,
+        stockfish_color,
+        theme=theme,
+        display_every=display_every,
     )
     game.play()
 
@@ -288,7 +437,7 @@ def play_puzzles():
     print("🧩 PUZZLE TRAINER")
     print("=" * 50)
 
-    trainer = PuzzleTrainer()
+    trainer = _get_trainer()
 
     print(f"\nAvailable puzzles: {len(trainer.puzzles)}")
     print("\nOptions:")
@@ -298,35 +447,49 @@ def play_puzzles():
 
     while True:
         choice = input("\nChoose option (1-3): ").strip()
-        if choice in ["1", "2", "3"]:
+        if choice in _OPTION_CHOICES:
             break
         print("❌ Invalid choice!")
 
-    if choice == "1":
-        num = input("\nHow many puzzles do you want to solve? (default=3): ").strip()
-        num_puzzles = int(num) if num.isdigit() else 3
-        trainer.training_session(num_puzzles, STOCKFISH_PATH)
+    # Start Stockfish once for the whole session rather than once per hint
+    engine = None
+    if os.path.exists(STOCKFISH_PATH):
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
+        except Exception as e:
+            print(f"⚠️  Could not start Stockfish for hints: {e}")
 
-    elif choice == "2":
-        puzzle = trainer.get_random_puzzle()
-        if puzzle:
-            trainer.solve_puzzle(puzzle, STOCKFISH_PATH)
+    try:
+        if choice == "1":
+            num = input(
+                "\nHow many puzzles do you want to solve? (default=3): "
+            ).strip()
+            num_puzzles = int(num) if num.isdigit() else 3
+            trainer.training_session(num_puzzles, STOCKFISH_PATH, engine)
 
-    elif choice == "3":
-        print("\nDifficulty levels:")
-        print("1. Easy")
-        print("2. Medium")
-        print("3. Hard")
-
-        diff_choice = input("\nChoose difficulty (1-3): ").strip()
-        difficulty_map = {"1": "Easy", "2": "Medium", "3": "Hard"}
-        difficulty = difficulty_map.get(diff_choice, "Easy")
-
-        puzzle = trainer.get_random_puzzle(difficulty)
-        if puzzle:
-            trainer.solve_puzzle(puzzle, STOCKFISH_PATH)
-        else:
-            print(f"\n❌ No puzzles found for difficulty: {difficulty}")
+        elif choice == "2":
+            puzzle = trainer.get_random_puzzle()
+            if puzzle:
+                trainer.solve_puzzle(puzzle, STOCKFISH_PATH, engine)
+
+        elif choice == "3":
+            print("\nDifficulty levels:")
+            print("1. Easy")
+            print("2. Medium")
+            print("3. Hard")
+
+            diff_choice = input("\nChoose difficulty (1-3): ").strip()
+            difficulty_map = {"1": "Easy", "2": "Medium", "3": "Hard"}
+            difficulty = difficulty_map.get(diff_choice, "Easy")
+
+            puzzle = trainer.get_random_puzzle(difficulty)
+            if puzzle:
+                trainer.solve_puzzle(puzzle, STOCKFISH_PATH, engine)
+            else:
+                print(f"\n❌ No puzzles found for difficulty: {difficulty}")
+    finally:
+        if engine is not None:
+            engine.quit()
 
 
 def explore_openings():
@@ -335,7 +498,7 @@ def explore_openings():
     print("📚 OPENING BOOK EXPLORER")
     print("=" * 50)
 
-    book = OpeningBook()
+    book = _get_book()
 
     print("\nOptions:")
     print("1. View all openings")
@@ -344,7 +507,7 @@ def explore_openings():
 
     while True:
         choice = input("\nChoose option (1-3): ").strip()
-        if choice in ["1", "2", "3"]:
+        if choice in _OPTION_CHOICES:
             break
         print("❌ Invalid choice!")
 
@@ -362,9 +525,12 @@ def explore_openings():
         print(board)
 
         while not board.is_game_over():
-            book.display_opening_info(board)
+            opening, suggested = book.probe(board)
+            if opening:
+                print(f"\n📚 Opening: {opening['name']} ({opening['eco']})")
+            else:
+                print("\n📚 Position not in opening book")
 
-            suggested = book.suggest_opening_move(board)
             if suggested:
                 print(f"💡 Book suggestion: {board.san(suggested)} ({suggested.uci()})")
 
@@ -381,9 +547,8 @@ def explore_openings():
 
             try:
                 move = chess.Move.from_uci(move_input)
-                if move in board.legal_moves:
-                    san = board.san(move)
-                    board.push(move)
+                if board.is_legal(move):
+                    san = board.san_and_push(move)
                     print(f"\nPlayed: {san}")
                     print(board)
                 else:
@@ -398,8 +563,7 @@ def explore_openings():
         board = chess.Board()
         for move_uci in ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4"]:
             move = chess.Move.from_uci(move_uci)
-            san = board.san(move)
-            board.push(move)
+            san = board.san_and_push(move)
             print(f"  {san}", end=" ")
 
         print("\n")
@@ -455,7 +619,7 @@ def play_online_multiplayer():
 
         if not client.login(username, password):
             print("❌ Login failed!")
-            client.disconnect()
+            client.close()
             return
 
     elif auth_choice == "2":
@@ -465,13 +629,13 @@ def play_online_multiplayer():
 
         if not client.register(username, password, email):
             print("❌ Registration failed!")
-            client.disconnect()
+            client.close()
             return
 
         print("\n✅ Registration successful! Now logging in...")
         if not client.login(username, password):
             print("❌ Login failed!")
-            client.disconnect()
+            client.close()
             return
 
     elif auth_choice == "3":
@@ -479,7 +643,7 @@ def play_online_multiplayer():
 
     else:
         print("❌ Invalid choice!")
-        client.disconnect()
+        client.close()
         return
 
     # Show user profile if logged in
@@ -580,66 +744,18 @@ def play_online_multiplayer():
             print("❌ Invalid choice!")
 
     # Disconnect from server
-    client.disconnect()
+    client.close()
     print("✅ Disconnected from server")
 
 
 def show_about():
     """Display information about the application."""
-    print("\n" + "=" * 60)
-    print("♔♕♖♗♘♙  ABOUT CYBERCHESS  ♟♞♝♜♛♚")
-    print("=" * 60)
-
-    print("\n📋 APPLICATION INFO")
-    print("  Name:        Cyberchess (CC)")
-    print("  Version:     0.4.0")
-    print("  Description: A modern chess platform with multiple game modes")
-
-    print("\n✨ FEATURES")
-    print("  • Full chess rules implementation")
-    print("  • Player vs Player mode")
-    print("  • Player vs Computer (Stockfish AI)")
-    print("  • AI vs AI (Stockfish vs Gemini)")
-    print("  • Online Multiplayer with user accounts")
-    print("  • Rating system (Elo-based)")
-    print("  • Mobile-responsive web interface")
-    print("  • Chess puzzle trainer with 8+ tactical puzzles")
-    print("  • Opening book with 12+ popular openings")
-    print("  • Time controls (Blitz, Rapid, Classical, Custom)")
-    print("  • Post-game engine analysis")
-    print("  • PGN import/export")
-
-    print("\n🔧 TECHNOLOGY STACK")
-    print("  • Language: Python 3.7+")
-    print("  • Chess Library: python-chess")
-    print("  • AI Engine: Stockfish")
-    print("  • AI Integration: Google Gemini 1.5 Flash")
-
-    print("\n👥 PROJECT")
-    print("  • Repository: https://github.com/GizzZmo/CC")
-    print("  • Issues: https://github.com/GizzZmo/CC/issues")
-    print("  • Discussions: https://github.com/GizzZmo/CC/discussions")
-
-    print("\n📄 LICENSE")
-    print("  • License information will be specified as development progresses")
-
-    print("\n💡 ACKNOWLEDGMENTS")
-    print("  • Chess programming community for insights and best practices")
-    print("  • Open source chess engines and libraries for inspiration")
-    print("  • All contributors who help make this project better")
-
-    print("\n" + "=" * 60)
-    print("Status: 🎉 Phase 3 & 4 Complete - Advanced Features Implemented!")
-    print("Last Updated: December 2025")
-    print("=" * 60)
+    print(_ABOUT_SCREEN)
 
 
 def main():
     """Main application loop."""
-    print("\n" + "♔" * 50)
-    print("Welcome to Cyberchess!")
-    print("A modern chess platform with multiple game modes")
-    print("♔" * 50)
+    print(_WELCOME_BANNER)
 
     while True:
         display_menu()
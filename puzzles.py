@@ -4,7 +4,9 @@ Provides tactical puzzles for players to solve.
 """
 
 import os
+import random
 import sys
+from collections import Counter
 from typing import Dict, List, Optional
 
 import chess
@@ -44,9 +46,32 @@ class ChessPuzzle:
         self.difficulty = difficulty
         self.description = description
 
+        # Parse the position and the solution once; boards handed out are
+        # copies of the template, so solving never re-reads the FEN
+        self._template_board = chess.Board(fen)
+        self.solution_moves = [chess.Move.from_uci(move_uci) for move_uci in solution]
+        self.san_solution = self._solution_to_san()
+
+    def _solution_to_san(self) -> List[str]:
+        """
+        Render the solution in SAN once, when the puzzle is loaded.
+        Moves from the first one that isn't legal in the line onwards are
+        kept in UCI, so the list always lines up with the solution.
+        """
+        board = self.get_board()
+        san_solution = []
+
+        for i, move in enumerate(self.solution_moves):
+            if not board.is_legal(move):
+                san_solution.extend(self.solution[i:])
+                break
+            san_solution.append(board.san_and_push(move))
+
+        return san_solution
+
     def get_board(self) -> chess.Board:
         """Get a board with the puzzle position."""
-        return chess.Board(self.fen)
+        return self._template_board.copy(stack=False)
 
 
 class PuzzleTrainer:
@@ -58,6 +83,22 @@ class PuzzleTrainer:
         self.current_puzzle = None
         self.current_index = 0
 
+        # Index the puzzle metadata once at load, so statistics and filtered
+        # picks don't rescan the whole library every time
+        self._by_theme: Dict[str, List[ChessPuzzle]] = {}
+        self._by_difficulty: Dict[str, List[ChessPuzzle]] = {}
+        for puzzle in self.puzzles:
+            self._by_theme.setdefault(puzzle.theme, []).append(puzzle)
+            self._by_difficulty.setdefault(puzzle.difficulty, []).append(puzzle)
+        self.themes = frozenset(self._by_theme)
+        self.difficulties = frozenset(self._by_difficulty)
+        self.theme_counts = Counter(
+            {theme: len(group) for theme, group in self._by_theme.items()}
+        )
+        self.difficulty_counts = Counter(
+            {level: len(group) for level, group in self._by_difficulty.items()}
+        )
+
     def _load_puzzles(self) -> List[ChessPuzzle]:
         """Load built-in chess puzzles."""
         return [
@@ -127,6 +168,20 @@ class PuzzleTrainer:
             ),
         ]
 
+    def catalog(self) -> List[Dict]:
+        """Get the puzzle library as plain data, for serving over the API."""
+        return [
+            {
+                "fen": puzzle.fen,
+                "solution": puzzle.solution,
+                "san_solution": puzzle.san_solution,
+                "theme": puzzle.theme,
+                "difficulty": puzzle.difficulty,
+                "description": puzzle.description,
+            }
+            for puzzle in self.puzzles
+        ]
+
     def get_puzzle(self, index: int = 0) -> Optional[ChessPuzzle]:
         """Get a puzzle by index."""
         if 0 <= index < len(self.puzzles):
@@ -137,23 +192,45 @@ class PuzzleTrainer:
         self, difficulty: Optional[str] = None
     ) -> Optional[ChessPuzzle]:
         """Get a random puzzle, optionally filtered by difficulty."""
-        import random
-
         if difficulty:
-            filtered = [p for p in self.puzzles if p.difficulty == difficulty]
+            filtered = self._by_difficulty.get(difficulty)
             if filtered:
                 return random.choice(filtered)
 
         return random.choice(self.puzzles) if self.puzzles else None
 
-    def solve_puzzle(self, puzzle: ChessPuzzle, stockfish_path: Optional[str] = None):
+    def solve_puzzle(
+        self,
+        puzzle: ChessPuzzle,
+        stockfish_path: Optional[str] = None,
+        engine: Optional[chess.engine.SimpleEngine] = None,
+    ):
         """
         Interactive puzzle solving session.
 
         Args:
             puzzle: The puzzle to solve
             stockfish_path: Optional path to Stockfish for hints
+            engine: Optional running engine for hints, owned by the caller.
+                Without it, Stockfish is started on the first hint and quit
+                when the puzzle ends
         """
+        # Engines started here for hints; they don't outlive the puzzle
+        started_engines: List[chess.engine.SimpleEngine] = []
+        try:
+            return self._run_puzzle(puzzle, stockfish_path, engine, started_engines)
+        finally:
+            for started_engine in started_engines:
+                started_engine.quit()
+
+    def _run_puzzle(
+        self,
+        puzzle: ChessPuzzle,
+        stockfish_path: Optional[str],
+        engine: Optional[chess.engine.SimpleEngine],
+        started_engines: List[chess.engine.SimpleEngine],
+    ) -> bool:
+        """Play through a puzzle; see solve_puzzle()."""
         print("\n" + "=" * 60)
         print(f"🧩 PUZZLE: {puzzle.theme} ({puzzle.difficulty})")
         print("=" * 60)
@@ -181,8 +258,14 @@ class PuzzleTrainer:
                     )
 
                     if user_input == "hint":
-                        if stockfish_path and os.path.exists(stockfish_path):
-                            self._show_hint(board, stockfish_path)
+                        if engine is None and (
+                            stockfish_path and os.path.exists(stockfish_path)
+                        ):
+                            engine = self._start_hint_engine(
+                                stockfish_path, started_engines
+                            )
+                        if engine is not None:
+                            self._show_hint(board, stockfish_path, engine)
                         else:
                             print(
                                 "💡 Hint: Look for forcing moves (checks, captures, threats)"
@@ -190,23 +273,21 @@ class PuzzleTrainer:
                         continue
 
                     if user_input == "solution":
-                        self._show_solution(board, puzzle.solution[solution_index:])
+                        self._show_solution(puzzle.san_solution[solution_index:])
                         return False
 
                     try:
                         user_move = chess.Move.from_uci(user_input)
 
-                        if user_move not in board.legal_moves:
+                        if not board.is_legal(user_move):
                             print("❌ Illegal move! Try again.")
                             continue
 
                         # Check if move matches solution
-                        expected_move = chess.Move.from_uci(
-                            puzzle.solution[solution_index]
-                        )
+                        expected_move = puzzle.solution_moves[solution_index]
 
                         if user_move == expected_move:
-                            san = board.san(user_move)
+                            san = puzzle.san_solution[solution_index]
                             board.push(user_move)
                             print(f"✅ Correct! {san}")
                             solution_index += 1
@@ -222,8 +303,8 @@ class PuzzleTrainer:
             else:
                 # Computer's response (part of solution)
                 if solution_index < len(puzzle.solution):
-                    response_move = chess.Move.from_uci(puzzle.solution[solution_index])
-                    san = board.san(response_move)
+                    response_move = puzzle.solution_moves[solution_index]
+                    san = puzzle.san_solution[solution_index]
                     board.push(response_move)
                     print(f"\nOpponent plays: {san}")
                     solution_index += 1
@@ -242,12 +323,22 @@ class PuzzleTrainer:
 
         return True
 
-    def _show_hint(self, board: chess.Board, stockfish_path: str):
+    def _show_hint(
+        self,
+        board: chess.Board,
+        stockfish_path: Optional[str],
+        engine: Optional[chess.engine.SimpleEngine] = None,
+    ):
         """Show a hint using Stockfish analysis."""
         try:
-            engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
-            info = engine.analyse(board, chess.engine.Limit(depth=15))
-            engine.quit()
+            if engine is not None:
+                info = engine.analyse(board, chess.engine.Limit(depth=15))
+            else:
+                engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+                try:
+                    info = engine.analyse(board, chess.engine.Limit(depth=15))
+                finally:
+                    engine.quit()
 
             if "pv" in info and info["pv"]:
                 best_move = info["pv"][0]
@@ -259,26 +350,36 @@ class PuzzleTrainer:
         except Exception as e:
             print(f"💡 Hint: Look for checks and captures! (Engine error: {e})")
 
-    def _show_solution(self, board: chess.Board, remaining_moves: List[str]):
+    def _start_hint_engine(
+        self, stockfish_path: str, started_engines: List[chess.engine.SimpleEngine]
+    ) -> Optional[chess.engine.SimpleEngine]:
+        """Start Stockfish for a puzzle's hints, or report why it couldn't."""
+        try:
+            engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
+        except Exception as e:
+            print(f"⚠️  Could not start Stockfish for hints: {e}")
+            return None
+        started_engines.append(engine)
+        return engine
+
+    def _show_solution(self, remaining_san: List[str]):
         """Show the complete solution."""
         print("\n📖 SOLUTION:")
-        temp_board = board.copy()
-
-        for i, move_uci in enumerate(remaining_moves):
-            move = chess.Move.from_uci(move_uci)
-            san = temp_board.san(move)
-            temp_board.push(move)
 
+        for i, san in enumerate(remaining_san):
             if i % 2 == 0:
                 print(f"  {i//2 + 1}. {san}", end="")
             else:
                 print(f" {san}")
 
-        if len(remaining_moves) % 2 == 1:
+        if len(remaining_san) % 2 == 1:
             print()  # New line if odd number of moves
 
     def training_session(
-        self, num_puzzles: int = 3, stockfish_path: Optional[str] = None
+        self,
+        num_puzzles: int = 3,
+        stockfish_path: Optional[str] = None,
+        engine: Optional[chess.engine.SimpleEngine] = None,
     ):
         """
         Run a training session with multiple puzzles.
@@ -286,6 +387,7 @@ class PuzzleTrainer:
         Args:
             num_puzzles: Number of puzzles to solve
             stockfish_path: Optional path to Stockfish for hints
+            engine: Optional running engine for hints, shared by all puzzles
         """
         print("\n" + "♔" * 60)
         print("CHESS PUZZLE TRAINING SESSION")
@@ -296,7 +398,7 @@ class PuzzleTrainer:
         for i in range(min(num_puzzles, len(self.puzzles))):
             puzzle = self.puzzles[i]
 
-            if self.solve_puzzle(puzzle, stockfish_path):
+            if self.solve_puzzle(puzzle, stockfish_path, engine):
                 solved += 1
 
             if i < num_puzzles - 1:
@@ -318,12 +420,10 @@ def demo_puzzles():
     print(f"\n📚 Available puzzles: {len(trainer.puzzles)}")
 
     # Show puzzle themes
-    themes = set(p.theme for p in trainer.puzzles)
-    print(f"\n🎯 Puzzle themes: {', '.join(themes)}")
+    print(f"\n🎯 Puzzle themes: {', '.join(trainer.themes)}")
 
     # Show difficulty levels
-    difficulties = set(p.difficulty for p in trainer.puzzles)
-    print(f"📊 Difficulty levels: {', '.join(difficulties)}")
+    print(f"📊 Difficulty levels: {', '.join(trainer.difficulties)}")
 
     # Show an example puzzle
     puzzle = trainer.get_puzzle(0)
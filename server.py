@@ -4,46 +4,235 @@ Flask-based server for online multiplayer chess.
 Provides REST API and WebSocket support for real-time gameplay.
 """
 
-import json
 import os
+
+# Set CYBERCHESS_ASYNC_MODE=eventlet to serve Socket.IO connections from
+# green threads instead of one OS thread each (requires eventlet). The
+# standard library has to be patched before anything imports it, so only
+# set it when server.py is the program being run, not when another program
+# imports this module.
+ASYNC_MODE = os.environ.get("CYBERCHESS_ASYNC_MODE", "threading")
+if ASYNC_MODE == "eventlet":
+    import eventlet
+
+    eventlet.monkey_patch()
+
+import atexit
+import base64
+import hashlib
+import json
+import logging
+import queue
+import random
 import secrets
+import threading
 import time
+from collections import deque
 from datetime import datetime
 from typing import Dict, Optional
 
 import chess
-import chess.pgn
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
 
 from database import ChessDatabase
+from json_codec import JSON, ORJSON_AVAILABLE
+from puzzles import PuzzleTrainer
+
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, used by request.json and jsonify."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return JSON.dumps(obj, default=self.default)
+
+    def loads(self, s, **kwargs):
+        return JSON.loads(s)
+
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__, static_folder="static")
+if ORJSON_AVAILABLE:
+    app.json = _OrjsonProvider(app)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", secrets.token_hex(32))
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+# The mobile GUI lists moves in SAN; set CYBERCHESS_EMIT_SAN=0 when every
+# client renders from UCI and FEN, to skip the extra move generation per move
+EMIT_SAN = os.environ.get("CYBERCHESS_EMIT_SAN", "1") != "0"
+
+socketio = SocketIO(
+    app,
+    async_mode=ASYNC_MODE,
+    cors_allowed_origins="*",
+)
 
 # Initialize database
 db = ChessDatabase()
 
-# Active game sessions (in-memory for real-time state)
+# The puzzle library is fixed, so its JSON is built once for /api/puzzles
+_PUZZLES_JSON = app.json.dumps(PuzzleTrainer().catalog())
+
+# Active game sessions (in-memory for real-time state). The live board in
+# each session is authoritative while its database writes are pending;
+# moves, resignations and joins read and update it under _sessions_lock.
 active_sessions: Dict[str, Dict] = {}
+_sessions_lock = threading.Lock()
+
+
+# Session tokens and game IDs are cut from batches of OS randomness, so
+# logins and matchmaking don't each make an os.urandom syscall
+_TOKEN_BATCH = 64
+_token_pools: Dict[int, deque] = {}
+_token_lock = threading.Lock()
+
+
+def _next_token(nbytes: int = 32) -> str:
+    """Return a URL-safe token with nbytes of randomness, like token_urlsafe."""
+    with _token_lock:
+        pool = _token_pools.setdefault(nbytes, deque())
+        if not pool:
+            batch = os.urandom(nbytes * _TOKEN_BATCH)
+            pool.extend(
+                base64.urlsafe_b64encode(batch[i : i + nbytes]).rstrip(b"=").decode()
+                for i in range(0, len(batch), nbytes)
+            )
+        return pool.popleft()
+
+
+# The health timestamp and PGN date are formatted at most once a second
+_time_strings = (0, "", "")
+_time_strings_lock = threading.Lock()
+
+
+def _now_strings():
+    """Return the current time as (ISO timestamp, PGN date), to the second."""
+    global _time_strings
+    second = int(time.time())
+    with _time_strings_lock:
+        if _time_strings[0] != second:
+            now = datetime.fromtimestamp(second)
+            _time_strings = (second, now.isoformat(), now.strftime("%Y.%m.%d"))
+        return _time_strings[1:]
+
+
+def _cache_session(session_id: str, game: Dict) -> Dict:
+    """
+    Cache an active game's row and live board. Hold _sessions_lock.
+    The board is replayed from the stored history only here, when a session
+    is first seen (e.g. after a server restart); after that moves are pushed
+    onto it in place, so the position is never re-parsed from FEN and
+    repetitions stay detectable.
+    """
+    board = chess.Board()
+    for move_uci in game["move_history"].split():
+        board.push_uci(move_uci)
+    session = {"game": game, "board": board}
+    active_sessions[session_id] = session
+    return session
+
+
+def _get_session(session_id: str) -> Optional[Dict]:
+    """
+    Get an active game's cached session. The database is only read the
+    first time this server sees the game; moves, resignations and joins
+    then use the cached player ids, time control and board.
+    """
+    with _sessions_lock:
+        session = active_sessions.get(session_id)
+        if session is None:
+            # Read under the lock: a finished game's row and session are
+            # removed together, so it can't be cached again in between
+            game = db.get_active_game(session_id)
+            if game is not None:
+                session = _cache_session(session_id, game)
+    return session
+
+
+# Database writes from the move handler are applied in order by one
+# background worker, so moves are broadcast without waiting on SQLite.
+# The worker is a daemon, so the queue is drained at exit.
+_db_writes: queue.Queue = queue.Queue()
+_db_writer_lock = threading.Lock()
+_db_writer_started = False
+
+
+def _run_db_writes():
+    """Apply queued database writes one at a time."""
+    while True:
+        task, args = _db_writes.get()
+        try:
+            task(*args)
+        except Exception:
+            logger.exception("Database write failed")
+        finally:
+            _db_writes.task_done()
+
+
+def _flush_db_writes():
+    """Wait until every queued database write has been applied."""
+    _db_writes.join()
+
+
+def _defer_db_write(task, *args):
+    """Queue a database write, starting the worker on first use."""
+    global _db_writer_started
+    with _db_writer_lock:
+        if not _db_writer_started:
+            socketio.start_background_task(_run_db_writes)
+            atexit.register(_flush_db_writes)
+            _db_writer_started = True
+    _db_writes.put((task, args))
+
+
+# Players waiting for a game, in the order they joined. The queue is as
+# short-lived as the sessions above, so it is kept in memory and pairing
+# doesn't take SQLite's write lock on every request.
+_matchmaking_queue: Dict[int, Dict] = {}
+_matchmaking_lock = threading.Lock()
+
+
+def _find_match(
+    user_id: int, rating: int, time_control: str, rating_range: int = 200
+) -> Optional[Dict]:
+    """Find the longest-waiting opponent for a player. Hold the queue lock."""
+    for entry in _matchmaking_queue.values():
+        if (
+            entry["user_id"] != user_id
+            and entry["time_control"] == time_control
+            and abs(entry["rating"] - rating) <= rating_range
+        ):
+            return entry
+    return None
 
 
 # ==================== REST API Routes ====================
 
 
+# The mobile GUI page is read and hashed once; index() serves it from memory
+# and answers revalidations with 304 Not Modified
+with open(os.path.join(app.root_path, "static", "mobile_gui.html"), "rb") as f:
+    _INDEX_BYTES = f.read()
+_INDEX_ETAG = hashlib.sha1(_INDEX_BYTES).hexdigest()
+
+
 @app.route("/")
 def index():
     """Serve the mobile web interface."""
-    return send_from_directory("static", "mobile_gui.html")
+    response = Response(_INDEX_BYTES, mimetype="text/html")
+    response.set_etag(_INDEX_ETAG)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
 
 
 @app.route("/api/health", methods=["GET"])
 def health_check():
     """Health check endpoint."""
-    return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
+    return jsonify({"status": "ok", "timestamp": _now_strings()[0]})
 
 
 @app.route("/api/register", methods=["POST"])
@@ -83,7 +272,7 @@ def login():
     user = db.authenticate_user(username, password)
     if user:
         # Create a session token
-        session_token = secrets.token_urlsafe(32)
+        session_token = _next_token(32)
         return jsonify(
             {
                 "success": True,
@@ -117,6 +306,12 @@ def get_leaderboard():
     return jsonify(leaderboard)
 
 
+@app.route("/api/puzzles", methods=["GET"])
+def get_puzzles():
+    """Get the puzzle library."""
+    return Response(_PUZZLES_JSON, mimetype="application/json")
+
+
 @app.route("/api/user/<int:user_id>/games", methods=["GET"])
 def get_user_games(user_id):
     """Get a user's game history."""
@@ -139,44 +334,46 @@ def join_matchmaking():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    # Add to matchmaking queue
-    if db.join_matchmaking_queue(user_id, user["rating"], time_control):
-        # Try to find a match
-        opponent = db.find_match(user_id)
-        if opponent:
-            # Create a game session
-            session_id = secrets.token_urlsafe(16)
-
-            # Randomly assign colors
-            import random
-
-            if random.random() < 0.5:
-                white_id, black_id = user_id, opponent["user_id"]
-            else:
-                white_id, black_id = opponent["user_id"], user_id
-
-            # Remove both from queue
-            db.leave_matchmaking_queue(user_id)
-            db.leave_matchmaking_queue(opponent["user_id"])
-
-            # Create active game
-            db.create_active_game(session_id, white_id, black_id, time_control)
-
-            return jsonify(
-                {
-                    "success": True,
-                    "matched": True,
-                    "session_id": session_id,
-                    "your_color": "white" if user_id == white_id else "black",
-                    "opponent_id": opponent["user_id"],
-                }
-            )
-        else:
+    # Pair with a waiting player or join the queue, in one step
+    with _matchmaking_lock:
+        if user_id in _matchmaking_queue:
+            return jsonify({"error": "Already in queue"}), 409
+        opponent = _find_match(user_id, user["rating"], time_control)
+        if opponent is None:
+            _matchmaking_queue[user_id] = {
+                "user_id": user_id,
+                "rating": user["rating"],
+                "time_control": time_control,
+            }
             return jsonify(
                 {"success": True, "matched": False, "message": "Waiting for opponent"}
             )
+        del _matchmaking_queue[opponent["user_id"]]
+
+    # Create a game session
+    session_id = _next_token(16)
+
+    # Randomly assign colors
+    if random.getrandbits(1):
+        white_id, black_id = user_id, opponent["user_id"]
     else:
-        return jsonify({"error": "Already in queue"}), 409
+        white_id, black_id = opponent["user_id"], user_id
+
+    # Create active game, and cache it so the first move doesn't read it back
+    db.create_active_game(session_id, white_id, black_id, time_control)
+    game = db.get_active_game(session_id)
+    with _sessions_lock:
+        _cache_session(session_id, game)
+
+    return jsonify(
+        {
+            "success": True,
+            "matched": True,
+            "session_id": session_id,
+            "your_color": "white" if user_id == white_id else "black",
+            "opponent_id": opponent["user_id"],
+        }
+    )
 
 
 @app.route("/api/matchmaking/leave", methods=["POST"])
@@ -188,7 +385,8 @@ def leave_matchmaking():
     if not user_id:
         return jsonify({"error": "User ID required"}), 400
 
-    db.leave_matchmaking_queue(user_id)
+    with _matchmaking_lock:
+        _matchmaking_queue.pop(user_id, None)
     return jsonify({"success": True})
 
 
@@ -197,6 +395,13 @@ def get_game_state(session_id):
     """Get current game state."""
     game = db.get_active_game(session_id)
     if game:
+        # The live board is ahead of the stored row while writes are pending
+        with _sessions_lock:
+            session = active_sessions.get(session_id)
+            if session is not None:
+                board = session["board"]
+                game["current_fen"] = board.fen()
+                game["move_history"] = " ".join(move.uci() for move in board.move_stack)
         return jsonify(game)
     else:
         return jsonify({"error": "Game not found"}), 404
@@ -208,14 +413,14 @@ def get_game_state(session_id):
 @socketio.on("connect")
 def handle_connect():
     """Handle client connection."""
-    print(f"Client connected: {request.sid}")
+    logger.debug("Client connected: %s", request.sid)
     emit("connected", {"message": "Connected to Cyberchess server"})
 
 
 @socketio.on("disconnect")
 def handle_disconnect():
     """Handle client disconnection."""
-    print(f"Client disconnected: {request.sid}")
+    logger.debug("Client disconnected: %s", request.sid)
 
 
 @socketio.on("join_game")
@@ -231,9 +436,18 @@ def handle_join_game(data):
     # Join the room for this game
     join_room(session_id)
 
-    # Get game state from database
-    game = db.get_active_game(session_id)
-    if game:
+    # Get game state, loading the session now rather than on the first move
+    session = _get_session(session_id)
+    if session:
+        game = session["game"]
+
+        # The live board is ahead of the stored row while writes are pending,
+        # so the position and history sent to the player come from it
+        with _sessions_lock:
+            board = session["board"]
+            fen = board.fen()
+            move_history = " ".join(move.uci() for move in board.move_stack)
+
         # Determine player's color
         if user_id == game["white_player_id"]:
             color = "white"
@@ -247,8 +461,8 @@ def handle_join_game(data):
             {
                 "session_id": session_id,
                 "color": color,
-                "fen": game["current_fen"],
-                "move_history": game["move_history"],
+                "fen": fen,
+                "move_history": move_history,
                 "white_time": game["white_time_remaining"],
                 "black_time": game["black_time_remaining"],
             },
@@ -286,192 +500,137 @@ def handle_make_move(data):
         return
 
     # Get game state
-    game = db.get_active_game(session_id)
-    if not game:
+    session = _get_session(session_id)
+    if not session:
         emit("error", {"message": "Game not found"})
         return
+    game = session["game"]
 
-    # Verify it's the player's turn
-    board = chess.Board(game["current_fen"])
-    if (board.turn == chess.WHITE and user_id != game["white_player_id"]) or (
-        board.turn == chess.BLACK and user_id != game["black_player_id"]
-    ):
-        emit("error", {"message": "Not your turn"})
-        return
-
-    # Validate and make the move
     try:
         move = chess.Move.from_uci(move_uci)
-        if move not in board.legal_moves:
+    except ValueError:
+        emit("error", {"message": "Invalid move"})
+        return
+
+    with _sessions_lock:
+        board = session["board"]
+
+        # The game stays cached until its result has been saved
+        if session.get("finished"):
+            emit("error", {"message": "Game is over"})
+            return
+
+        # Verify it's the player's turn
+        if (board.turn == chess.WHITE and user_id != game["white_player_id"]) or (
+            board.turn == chess.BLACK and user_id != game["black_player_id"]
+        ):
+            emit("error", {"message": "Not your turn"})
+            return
+
+        # Validate and make the move
+        if not board.is_legal(move):
             emit("error", {"message": "Illegal move"})
             return
 
         # Make the move
-        san_move = board.san(move)
-        board.push(move)
-
-        # Update move history
-        move_history = game["move_history"]
-        if move_history:
-            move_history += " " + move_uci
+        move_data = {"move": move_uci}
+        if EMIT_SAN:
+            move_data["san"] = board.san_and_push(move)
         else:
-            move_history = move_uci
+            board.push(move)
 
-        # Update database
-        db.update_active_game(
-            session_id,
-            board.fen(),
-            move_history,
-            game["white_time_remaining"],
-            game["black_time_remaining"],
-        )
+        # Check for the end of the game once; the broadcast and the save
+        # below both use it
+        outcome = board.outcome()
+        result = outcome.result() if outcome is not None else None
+        if outcome is not None:
+            session["finished"] = True
 
-        # Broadcast the move to all players in the room
+        # Broadcast the move to all players in the room before touching the
+        # database; the live board is what later moves are checked against
         emit(
             "move_made",
             {
-                "move": move_uci,
-                "san": san_move,
+                **move_data,
                 "fen": board.fen(),
-                "game_over": board.is_game_over(),
-                "result": board.result() if board.is_game_over() else None,
+                "game_over": outcome is not None,
+                "result": result,
             },
             room=session_id,
         )
 
-        # If game is over, save to database and update ratings
-        if board.is_game_over():
-            result = board.result()
-
-            # Create PGN
-            game_pgn = chess.pgn.Game()
-            game_pgn.headers["Event"] = "Cyberchess Online Game"
-            game_pgn.headers["Date"] = datetime.now().strftime("%Y.%m.%d")
-            game_pgn.headers["Result"] = result
-
-            # Rebuild game from moves
-            node = game_pgn
-            temp_board = chess.Board()
-            for uci_move in move_history.split():
-                move = chess.Move.from_uci(uci_move)
-                node = node.add_variation(move)
-                temp_board.push(move)
-
-            pgn_string = str(game_pgn)
-
-            # Get player ratings
-            white_player = db.get_user_by_id(game["white_player_id"])
-            black_player = db.get_user_by_id(game["black_player_id"])
-
-            white_rating_before = white_player["rating"]
-            black_rating_before = black_player["rating"]
-
-            # Calculate new ratings
-            if result == "1-0":
-                white_score, black_score = 1.0, 0.0
-            elif result == "0-1":
-                white_score, black_score = 0.0, 1.0
-            else:
-                white_score, black_score = 0.5, 0.5
-
-            white_rating_after = db.calculate_elo_rating(
-                white_rating_before, black_rating_before, white_score
-            )
-            black_rating_after = db.calculate_elo_rating(
-                black_rating_before, white_rating_before, black_score
-            )
-
-            # Update ratings in database
-            db.update_user_rating(game["white_player_id"], white_rating_after)
-            db.update_user_rating(game["black_player_id"], black_rating_after)
-
-            # Record the game
-            db.record_game(
-                game["white_player_id"],
-                game["black_player_id"],
-                result,
-                pgn_string,
-                white_rating_before,
-                black_rating_before,
-                white_rating_after,
-                black_rating_after,
-                game["time_control"],
-            )
-
-            # Delete active game
-            db.delete_active_game(session_id)
-
-            # Notify players of rating changes
-            emit(
-                "ratings_updated",
-                {
-                    "white_rating_change": white_rating_after - white_rating_before,
-                    "black_rating_change": black_rating_after - black_rating_before,
-                },
-                room=session_id,
-            )
-
-    except Exception as e:
-        emit("error", {"message": str(e)})
-
-
-@socketio.on("resign")
-def handle_resign(data):
-    """Handle player resignation."""
-    session_id = data.get("session_id")
-    user_id = data.get("user_id")
-
-    if not session_id or not user_id:
-        emit("error", {"message": "Session ID and User ID required"})
-        return
-
-    game = db.get_active_game(session_id)
-    if not game:
-        emit("error", {"message": "Game not found"})
-        return
-
-    # Determine result based on who resigned
-    if user_id == game["white_player_id"]:
-        result = "0-1"
-    else:
-        result = "1-0"
-
-    # Broadcast resignation
-    emit("player_resigned", {"user_id": user_id, "result": result}, room=session_id)
+        # Persist the new state, then, if the game is over, save it and
+        # update ratings. Queued under the lock, so writes keep move order.
+        _defer_db_write(
+            db.update_active_game,
+            session_id,
+            board.fen(),
+            " ".join(game_move.uci() for game_move in board.move_stack),
+            game["white_time_remaining"],
+            game["black_time_remaining"],
+        )
+        if outcome is not None:
+            _defer_db_write(_finish_game, session_id, game, board, result)
+
+
+def _pgn_string(result: str, movetext: str = "", termination: str = "") -> str:
+    """
+    Write a recorded game's PGN directly as text, with the same tags as
+    chess.pgn would, rather than building a game tree just to print it.
+    """
+    tags = [
+        ("Event", "Cyberchess Online Game"),
+        ("Site", "?"),
+        ("Date", _now_strings()[1]),
+        ("Round", "?"),
+        ("White", "?"),
+        ("Black", "?"),
+        ("Result", result),
+    ]
+    if termination:
+        tags.append(("Termination", termination))
+    header = "\n".join(f'[{name} "{value}"]' for name, value in tags)
+    return f"{header}\n\n{movetext} {result}" if movetext else f"{header}\n\n{result}"
+
+
+def _finish_game(
+    session_id: str,
+    game: Dict,
+    board: chess.Board,
+    result: str,
+    termination: str = "",
+):
+    """Record a finished online game, update ratings and notify the room."""
+    # Create PGN from the moves played on the live board
+    pgn_string = _pgn_string(
+        result, board.root().variation_san(board.move_stack), termination
+    )
 
-    # Get player ratings and update them
+    # Get player ratings
     white_player = db.get_user_by_id(game["white_player_id"])
     black_player = db.get_user_by_id(game["black_player_id"])
 
     white_rating_before = white_player["rating"]
     black_rating_before = black_player["rating"]
 
-    # Calculate new ratings based on resignation
+    # Calculate new ratings
     if result == "1-0":
-        white_score, black_score = 1.0, 0.0
+        white_score = 1.0
+    elif result == "0-1":
+        white_score = 0.0
     else:
-        white_score, black_score = 0.0, 1.0
+        white_score = 0.5
 
-    white_rating_after = db.calculate_elo_rating(
+    white_change, black_change = db.calculate_elo_delta(
         white_rating_before, black_rating_before, white_score
     )
-    black_rating_after = db.calculate_elo_rating(
-        black_rating_before, white_rating_before, black_score
-    )
+    white_rating_after = white_rating_before + white_change
+    black_rating_after = black_rating_before + black_change
 
-    # Update ratings
+    # Update ratings in database
     db.update_user_rating(game["white_player_id"], white_rating_after)
     db.update_user_rating(game["black_player_id"], black_rating_after)
 
-    # Create PGN for resigned game
-    game_pgn = chess.pgn.Game()
-    game_pgn.headers["Event"] = "Cyberchess Online Game"
-    game_pgn.headers["Date"] = datetime.now().strftime("%Y.%m.%d")
-    game_pgn.headers["Result"] = result
-    game_pgn.headers["Termination"] = "resignation"
-
-    pgn_string = str(game_pgn)
-
     # Record the game
     db.record_game(
         game["white_player_id"],
@@ -485,7 +644,58 @@ def handle_resign(data):
         game["time_control"],
     )
 
-    db.delete_active_game(session_id)
+    # Delete active game
+    with _sessions_lock:
+        db.delete_active_game(session_id)
+        active_sessions.pop(session_id, None)
+
+    # Notify players of rating changes
+    socketio.emit(
+        "ratings_updated",
+        {
+            "white_rating_change": white_rating_after - white_rating_before,
+            "black_rating_change": black_rating_after - black_rating_before,
+        },
+        to=session_id,
+    )
+
+
+@socketio.on("resign")
+def handle_resign(data):
+    """Handle player resignation."""
+    session_id = data.get("session_id")
+    user_id = data.get("user_id")
+
+    if not session_id or not user_id:
+        emit("error", {"message": "Session ID and User ID required"})
+        return
+
+    session = _get_session(session_id)
+    if not session:
+        emit("error", {"message": "Game not found"})
+        return
+    game = session["game"]
+
+    # Determine result based on who resigned
+    if user_id == game["white_player_id"]:
+        result = "0-1"
+    else:
+        result = "1-0"
+
+    # A game that ended on the board (or was already resigned) may still have
+    # its row while its result is being saved; only the first ending counts.
+    # The result is saved the same way as a checkmate, after any queued moves.
+    with _sessions_lock:
+        if session.get("finished"):
+            emit("error", {"message": "Game is over"})
+            return
+        session["finished"] = True
+        _defer_db_write(
+            _finish_game, session_id, game, session["board"], result, "resignation"
+        )
+
+    # Broadcast resignation
+    emit("player_resigned", {"user_id": user_id, "result": result}, room=session_id)
 
 
 def main():
@@ -500,6 +710,10 @@ def main():
 
     # Debug mode controlled by environment variable (default: False for security)
     debug_mode = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
+    # Connection events are logged at debug level only
+    logging.basicConfig(
+        level=logging.DEBUG if debug_mode else logging.INFO, format="%(message)s"
+    )
     # Bind to all interfaces only in debug mode, otherwise bind to localhost for security
     host = "0.0.0.0" if debug_mode else "127.0.0.1"  # nosec B104
     socketio.run(app, host=host, port=5000, debug=debug_mode)
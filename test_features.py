@@ -4,13 +4,27 @@ Test suite for Cyberchess Phase 3 and Phase 4 features.
 This file tests the new features added in advanced phases.
 """
 
+import contextlib
+import functools
+import importlib.util
+import io
+import multiprocessing
 import os
+import shutil
+import struct
 import sys
+import tempfile
+import types
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
 import chess
 import chess.engine
+import chess.pgn
+import chess.polyglot
 
 from game_modes import ChessGame, PlayerVsComputerGame, PlayerVsPlayerGame
+from opening_book import OpeningBook
 
 # Configure stdout/stderr to use UTF-8 encoding on Windows
 if sys.stdout.encoding != "utf-8":
@@ -22,6 +36,79 @@ if sys.stderr.encoding != "utf-8":
 STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH", "/usr/games/stockfish")
 
 
+@functools.lru_cache(maxsize=None)
+def _stockfish_path() -> Optional[str]:
+    """Find Stockfish once: STOCKFISH_PATH if it exists, else on the PATH."""
+    if os.path.exists(STOCKFISH_PATH):
+        return STOCKFISH_PATH
+    return shutil.which("stockfish")
+
+
+# Game fixtures, parsed once and shared by the tests below
+SCHOLARS_MATE = tuple(
+    chess.Move.from_uci(move_uci)
+    for move_uci in ("e2e4", "e7e5", "f1c4", "b8c6", "d1h5", "g8f6", "h5f7")
+)
+FOOLS_MATE = tuple(
+    chess.Move.from_uci(move_uci) for move_uci in ("f2f3", "e7e5", "g2g4", "d8h4")
+)
+ITALIAN_OPENING = tuple(
+    chess.Move.from_uci(move_uci) for move_uci in ("e2e4", "e7e5", "g1f3", "b8c6")
+)
+
+# A minimal UCI engine for tests that don't need Stockfish's strength: it
+# accepts a skill level, always plays the first legal move and, given a log
+# path, appends a line to it for every UCI handshake
+_STUB_ENGINE_SOURCE = """
+import sys
+
+import chess
+
+board = chess.Board()
+for line in sys.stdin:
+    command = line.split()
+    if not command:
+        continue
+    if command[0] == "uci":
+        if len(sys.argv) > 1:
+            with open(sys.argv[1], "a") as log:
+                log.write("uci\\n")
+        print("id name StubEngine")
+        print("option name Skill Level type spin default 20 min 0 max 20")
+        print("uciok")
+    elif command[0] == "isready":
+        print("readyok")
+    elif command[0] == "position":
+        if command[1] == "startpos":
+            board = chess.Board()
+        else:
+            board = chess.Board(" ".join(command[2:8]))
+        if "moves" in command:
+            for move in command[command.index("moves") + 1 :]:
+                board.push_uci(move)
+    elif command[0] == "go":
+        print("bestmove " + next(iter(board.legal_moves)).uci())
+    elif command[0] == "quit":
+        break
+    sys.stdout.flush()
+"""
+
+
+def _write_stub_engine(directory: str, *args: str) -> list:
+    """Write the stub engine to directory and return its command line."""
+    path = os.path.join(directory, "stub_engine.py")
+    with open(path, "w") as f:
+        f.write(_STUB_ENGINE_SOURCE)
+    return [sys.executable, path, *args]
+
+
+class _FirstMoveGemini:
+    """Stands in for the Gemini model: answers the first move it may pick."""
+
+    def generate_content(self, prompt, generation_config=None):
+        return types.SimpleNamespace(text=generation_config.response_schema["enum"][0])
+
+
 def test_time_controls():
     """Test time control functionality."""
     print("=" * 60)
@@ -59,8 +146,9 @@ def test_game_analysis():
     print("=" * 60)
 
     # Check if Stockfish is available
-    if not os.path.exists(STOCKFISH_PATH):
-        print(f"⚠️  Stockfish not found at {STOCKFISH_PATH}")
+    stockfish_path = _stockfish_path()
+    if stockfish_path is None:
+        print(f"⚠️  Stockfish not found at {STOCKFISH_PATH} or on the PATH")
         print("⚠️  Skipping analysis test")
         return
 
@@ -68,22 +156,34 @@ def test_game_analysis():
     game = ChessGame()
 
     # Play a few moves (Scholar's Mate)
-    moves = ["e2e4", "e7e5", "f1c4", "b8c6", "d1h5", "g8f6", "h5f7"]
-
     print("Playing a short game...")
-    for move_uci in moves:
-        move = chess.Move.from_uci(move_uci)
-        if move in game.board.legal_moves:
+    for move in SCHOLARS_MATE:
+        if game.board.is_legal(move):
             game.make_move(move)
 
     print(f"✓ Game completed with {len(game.move_history)} moves")
 
-    # Analyze the game
+    # Analyze the game with one engine, so its hash table carries over from
+    # each position to the next
     try:
         print("\nAnalyzing game...")
-        analysis = game.analyze_game(STOCKFISH_PATH, depth=10)
+        with chess.engine.SimpleEngine.popen_uci(
+            stockfish_path
+        ) as engine, tempfile.TemporaryDirectory() as directory:
+            engine.configure(
+                {"Hash": 512, "Threads": max(1, (os.cpu_count() or 1) // 2)}
+            )
+            # A fresh cache each run: the first pass fills it and the second
+            # must be answered from it with the same evaluations
+            cache_path = os.path.join(directory, "analysis")
+            analysis = game.analyze_game(depth=10, engine=engine, cache_path=cache_path)
+            assert (
+                game.analyze_game(depth=10, engine=engine, cache_path=cache_path)
+                == analysis
+            )
 
         print(f"✓ Analysis completed: {len(analysis)} positions evaluated")
+        print("✓ Repeat analysis matches the cached evaluations")
 
         # Display analysis summary
         game.display_game_analysis(analysis)
@@ -124,17 +224,9 @@ def test_move_history():
     game = ChessGame()
 
     # Play some moves
-    moves = [
-        ("e2e4", "e4"),
-        ("e7e5", "e5"),
-        ("g1f3", "Nf3"),
-        ("b8c6", "Nc6"),
-    ]
-
-    for uci, expected_san in moves:
-        move = chess.Move.from_uci(uci)
+    for move, expected_san in zip(ITALIAN_OPENING, ["e4", "e5", "Nf3", "Nc6"]):
         san = game.make_move(move)
-        print(f"✓ Move {uci} recorded as {san}")
+        print(f"✓ Move {move.uci()} recorded as {san}")
 
     print(f"\n✓ Total moves in history: {len(game.move_history)}")
 
@@ -151,9 +243,8 @@ def test_game_states():
 
     # Test checkmate
     game = ChessGame()
-    # Fool's Mate
-    for move_uci in ["f2f3", "e7e5", "g2g4", "d8h4"]:
-        game.make_move(chess.Move.from_uci(move_uci))
+    for move in FOOLS_MATE:
+        game.make_move(move)
 
     if game.board.is_checkmate():
         print("✓ Checkmate detected correctly (Fool's Mate)")
@@ -186,32 +277,178 @@ def test_pgn_export():
     game = ChessGame()
 
     # Play a short game
-    for move_uci in ["e2e4", "e7e5", "g1f3", "b8c6"]:
-        game.make_move(chess.Move.from_uci(move_uci))
+    for move in ITALIAN_OPENING:
+        game.make_move(move)
+
+    # Save to an in-memory stream; nothing touches the disk
+    buffer = io.StringIO()
+    game.save_to_pgn(buffer, "Test Player 1", "Test Player 2", "Test Game")
+
+    content = buffer.getvalue()
+    assert '[White "Test Player 1"]' in content
+    assert '[Black "Test Player 2"]' in content
+    assert "1. e4 e5 2. Nf3 Nc6" in content
+    print("✓ PGN headers and moves correct")
+
+    # Headless games skip SAN while playing; the export must not change
+    headless = ChessGame(record_san=False)
+    for move in ITALIAN_OPENING:
+        assert headless.make_move(move) == move.uci()
+    assert headless.move_history == []
+    assert headless.to_pgn("Test Player 1", "Test Player 2", "Test Game") == (
+        game.to_pgn("Test Player 1", "Test Player 2", "Test Game")
+    )
+    print("✓ PGN identical when SAN is skipped during play")
+
+    # Shuffle the knights until the movetext needs several lines
+    for _ in range(8):
+        for move_uci in ("f3g1", "c6b8", "g1f3", "b8c6"):
+            move = chess.Move.from_uci(move_uci)
+            game.make_move(move)
+            headless.make_move(move)
+
+    pgn_text = game.to_pgn('Test "Player" \\1', "Test Player 2", "Test Game")
+    assert '[White "Test \\"Player\\" \\\\1"]' in pgn_text
+    movetext = pgn_text.split("\n\n", 1)[1]
+    assert "\n" in movetext
+    assert all(len(line) <= 80 for line in movetext.splitlines())
+    assert headless.to_pgn('Test "Player" \\1', "Test Player 2", "Test Game") == (
+        pgn_text
+    )
+    print("✓ Tag values escaped and movetext wrapped at 80 columns")
+
+    print("\n✅ PGN export test PASSED\n")
 
-    # Save to PGN
-    test_pgn = "test_game.pgn"
 
-    # Remove old test file if it exists
-    if os.path.exists(test_pgn):
-        os.remove(test_pgn)
+def test_opening_book():
+    """Test opening identification and book suggestions."""
+    print("=" * 60)
+    print("TEST 7: Opening Book")
+    print("=" * 60)
 
-    game.save_to_pgn(test_pgn, "Test Player 1", "Test Player 2", "Test Game")
+    book = OpeningBook()
+
+    # Exact book position
+    board = chess.Board()
+    for move_uci in ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4"]:
+        board.push_uci(move_uci)
+    opening = book.identify_opening(board)
+    assert opening == {"name": "Italian Game", "eco": "C50"}
+    print(f"✓ Identified: {opening['name']} ({opening['eco']})")
+
+    suggested = book.suggest_opening_move(board)
+    assert suggested is not None and suggested.uci() in ["g8f6", "f8c5", "d7d6"]
+    print(f"✓ Book suggests: {board.san(suggested)}")
+
+    opening, move = book.probe(board)
+    assert opening == {"name": "Italian Game", "eco": "C50"}
+    assert move is not None and move.uci() in ["g8f6", "f8c5", "d7d6"]
+    print("✓ probe() returns the opening and a book move together")
+
+    seeded = OpeningBook()
+    seeded.seed(42)
+    picks = [seeded.suggest_opening_move(board) for _ in range(5)]
+    seeded.seed(42)
+    assert [seeded.suggest_opening_move(board) for _ in range(5)] == picks
+    print("✓ Seeded book suggestions are reproducible")
+
+    # Continuing past the end of a book line keeps the opening name
+    board.push_uci("g8f6")
+    assert book.identify_opening(board)["name"] == "Italian Game"
+    assert book.suggest_opening_move(board) is None
+    print("✓ Opening still identified after leaving the book")
+
+    # Transpositions reach the same book position
+    board = chess.Board()
+    for move_uci in ["c2c4", "d7d5", "d2d4"]:
+        board.push_uci(move_uci)
+    assert book.identify_opening(board)["name"] == "Queen's Gambit"
+    print("✓ Transposition into the Queen's Gambit recognised")
+
+    assert book.identify_opening(chess.Board()) is None
+    print("✓ Starting position not in book")
+
+    # A Polyglot book supplies moves for positions outside the built-in lines
+    polyglot_file = "test_book.bin"
+    board = chess.Board()
+    with open(polyglot_file, "wb") as f:
+        # One entry: 1.d4 from the starting position (from d2, to d4)
+        move_bits = (1 << 9) | (3 << 6) | (3 << 3) | 3
+        f.write(
+            struct.pack(">QHHI", chess.polyglot.zobrist_hash(board), move_bits, 1, 0)
+        )
+    polyglot_book = OpeningBook(polyglot_file)
+    try:
+        assert polyglot_book.suggest_opening_move(board) == chess.Move.from_uci("d2d4")
+        assert polyglot_book.probe(board) == (None, chess.Move.from_uci("d2d4"))
+        print("✓ Polyglot book suggests 1.d4 from the starting position")
+    finally:
+        polyglot_book.close()
+        os.remove(polyglot_file)
 
-    if os.path.exists(test_pgn):
-        print(f"✓ PGN file created: {test_pgn}")
+    print("\n✅ Opening book test PASSED\n")
 
-        # Read and verify
-        with open(test_pgn, "r") as f:
-            content = f.read()
-            if "Test Player 1" in content and "Test Player 2" in content:
-                print("✓ PGN headers correct")
 
-        # Clean up
-        os.remove(test_pgn)
-        print("✓ Test file cleaned up")
+def test_training_batch():
+    """Test AI vs AI training games played in worker processes."""
+    print("=" * 60)
+    print("TEST 8: AI vs AI Training Batch")
+    print("=" * 60)
 
-    print("\n✅ PGN export test PASSED\n")
+    if importlib.util.find_spec("google.generativeai") is None:
+        print("⚠️  google-generativeai not installed")
+        print("⚠️  Skipping training batch test")
+        return
+
+    from game_modes import run_training_batch
+
+    with tempfile.TemporaryDirectory() as directory:
+        pgn_path = os.path.join(directory, "games.pgn")
+        handshake_log = os.path.join(directory, "handshakes.log")
+
+        # Two games through a spawned worker; the engine command and the
+        # stand-in Gemini model are pickled across to it
+        saved = run_training_batch(
+            2,
+            _write_stub_engine(directory, handshake_log),
+            "unused",
+            max_workers=1,
+            pgn_path=pgn_path,
+            gemini_model=_FirstMoveGemini(),
+        )
+        assert saved == 2
+        print("✓ Two games played through the process pool")
+
+        with open(handshake_log) as f:
+            assert f.read().split() == ["uci"]
+        print("✓ The worker's games shared one engine process")
+
+        with open(pgn_path) as f:
+            games = [chess.pgn.read_game(f) for _ in range(saved)]
+
+    for game in games:
+        board = game.end().board()
+        assert game.headers["Event"] == "Cyberchess AI Training"
+        assert board.is_game_over()
+        assert game.headers["Result"] == board.result()
+    print("✓ Saved PGN replays to finished games with matching results")
+
+    print("\n✅ Training batch test PASSED\n")
+
+
+def _run_captured(test):
+    """Run one test in a worker process; returns (passed, its output)."""
+    # A UTF-8 text stream, like the one modules reconfigure stdout to
+    output = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            test()
+            passed = True
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}\n")
+            passed = False
+    output.flush()
+    return passed, output.buffer.getvalue().decode("utf-8")
 
 
 def run_all_tests():
@@ -227,18 +464,28 @@ def run_all_tests():
         test_move_history,
         test_game_states,
         test_pgn_export,
+        test_opening_book,
+        test_training_batch,
     ]
 
     passed = 0
     failed = 0
 
-    for test in tests:
-        try:
-            test()
-            passed += 1
-        except Exception as e:
-            print(f"❌ Test failed with error: {e}\n")
-            failed += 1
+    # The tests are independent, so they run side by side (the engine
+    # analysis overlaps the rest); output is printed in order. Spawned
+    # workers don't inherit the parent's engine pipes.
+    with ProcessPoolExecutor(
+        max_workers=min(len(tests), os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = [executor.submit(_run_captured, test) for test in tests]
+        for future in futures:
+            test_passed, output = future.result()
+            print(output, end="")
+            if test_passed:
+                passed += 1
+            else:
+                failed += 1
 
     print("=" * 60)
     print(f"TEST SUMMARY: {passed} passed, {failed} failed")
@@ -4,7 +4,13 @@ Test script for online multiplayer features.
 Tests database, user management, and rating system.
 """
 
+import contextlib
+import io
+import multiprocessing
+import os
+import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 
 def test_database():
@@ -16,17 +22,23 @@ def test_database():
     try:
         from database import ChessDatabase
 
-        # Create in-memory database
+        # Create in-memory database. It is thrown away afterwards, so its
+        # temporary tables and a 64 MB page cache stay in memory too. The
+        # rollback journal stays on, so transaction() can still undo a block.
         db = ChessDatabase(":memory:")
+        db.connect().execute("PRAGMA temp_store=MEMORY")
+        db.connect().execute("PRAGMA cache_size=-64000")
         print("✅ Database initialized successfully")
 
-        # Test user creation
-        user1_id = db.create_user("Alice", "password123", "alice@example.com")
-        user2_id = db.create_user("Bob", "password456", "bob@example.com")
+        # Test user creation, committed together in one transaction
+        with db.transaction():
+            user1_id = db.create_user("Alice", "password123", "alice@example.com")
+            user2_id = db.create_user("Bob", "password456", "bob@example.com")
+
+            # Test duplicate user
+            duplicate = db.create_user("Alice", "newpass", "different@email.com")
         print(f"✅ Created users: Alice (ID={user1_id}), Bob (ID={user2_id})")
 
-        # Test duplicate user
-        duplicate = db.create_user("Alice", "newpass", "different@email.com")
         if duplicate is None:
             print("✅ Duplicate username correctly rejected")
         else:
@@ -62,6 +74,15 @@ def test_database():
         new_rating_draw = db.calculate_elo_rating(rating_before, opponent_rating, 0.5)
         print(f"✅ Elo calculation (draw): {rating_before} → {new_rating_draw}")
 
+        # Both players' changes in one call are zero-sum and match the
+        # per-player calculation
+        white_change, black_change = db.calculate_elo_delta(
+            rating_before, opponent_rating, 1.0
+        )
+        assert white_change == new_rating_win - rating_before
+        assert black_change == -white_change
+        print(f"✅ Elo delta (win): {white_change:+d} / {black_change:+d}")
+
         # Test game recording
         game_id = db.record_game(
             user1_id,
@@ -153,8 +174,6 @@ def test_file_structure():
     print("Testing File Structure")
     print("=" * 60)
 
-    import os
-
     required_files = [
         "database.py",
         "server.py",
@@ -166,9 +185,22 @@ def test_file_structure():
         "requirements.txt",
     ]
 
+    # List each directory once instead of stat-ing every file
+    present = set()
+    for directory in {os.path.dirname(file_path) for file_path in required_files}:
+        try:
+            with os.scandir(directory or ".") as entries:
+                present.update(
+                    os.path.join(directory, entry.name)
+                    for entry in entries
+                    if entry.is_file()
+                )
+        except FileNotFoundError:
+            pass
+
     all_exist = True
     for file_path in required_files:
-        if os.path.exists(file_path):
+        if os.path.normpath(file_path) in present:
             print(f"✅ {file_path}")
         else:
             print(f"❌ {file_path} not found")
@@ -182,6 +214,10 @@ def test_file_structure():
     return all_exist
 
 
+# The package name at the start of each requirements.txt line
+_REQUIREMENT_NAME = re.compile(r"^\s*([a-z0-9][a-z0-9._-]*)", re.MULTILINE)
+
+
 def test_requirements():
     """Test requirements.txt has new dependencies."""
     print("\n" + "=" * 60)
@@ -200,9 +236,12 @@ def test_requirements():
         with open("requirements.txt", "r") as f:
             content = f.read().lower()
 
+        # Collect every listed package name in one pass
+        listed = set(_REQUIREMENT_NAME.findall(content))
+
         all_found = True
         for package in required_packages:
-            if package in content:
+            if package in listed:
                 print(f"✅ {package}")
             else:
                 print(f"❌ {package} not found in requirements.txt")
@@ -220,19 +259,41 @@ def test_requirements():
         return False
 
 
+def _run_captured(test):
+    """Run one test category in a worker process; returns (result, output)."""
+    # A UTF-8 text stream, like the one modules reconfigure stdout to
+    output = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        result = test()
+    output.flush()
+    return result, output.buffer.getvalue().decode("utf-8")
+
+
 def main():
     """Run all tests."""
     print("\n" + "=" * 60)
     print("CYBERCHESS ONLINE MULTIPLAYER TEST SUITE")
     print("=" * 60)
 
+    tests = {
+        "file_structure": test_file_structure,
+        "requirements": test_requirements,
+        "module_imports": test_module_imports,
+        "database": test_database,
+    }
     results = {}
 
-    # Run tests
-    results["file_structure"] = test_file_structure()
-    results["requirements"] = test_requirements()
-    results["module_imports"] = test_module_imports()
-    results["database"] = test_database()
+    # Run the categories side by side, printing their output in order
+    with ProcessPoolExecutor(
+        max_workers=min(len(tests), os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = {
+            name: executor.submit(_run_captured, test) for name, test in tests.items()
+        }
+        for name, future in futures.items():
+            results[name], output = future.result()
+            print(output, end="")
 
     # Summary
     print("\n" + "=" * 60)